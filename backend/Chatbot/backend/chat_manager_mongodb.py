@@ -2,72 +2,314 @@
 MongoDB-based Multi-Chat Session Manager for FYP Buddy AI
 Replaces JSON file storage with MongoDB for better scalability
 """
-from datetime import datetime
-from pymongo import MongoClient, DESCENDING
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from pymongo import MongoClient, ASCENDING, DESCENDING, TEXT, DeleteMany, ReplaceOne, ReturnDocument, UpdateOne
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import atexit
+import os
+import sys
+import threading
 import time
 
+# Formatted recent turns kept ready on every session for prompt building
+HISTORY_BUFFER_SIZE = 16
+# Messages per page document in chat_messages (message n lives in page n // size);
+# changing it after messages are stored breaks page addressing
+MESSAGE_PAGE_SIZE = 50
+# Seconds session writes may wait in memory before they are flushed (0 writes every
+# save immediately); this is the window of turns lost if the process dies
+DEFAULT_WRITE_BEHIND_SECONDS = 0
+# Dirty sessions that trigger a flush before the interval is up
+DEFAULT_WRITE_BEHIND_MAX_PENDING = 20
+# Title matches count this many times a message match in search ranking
+TITLE_SEARCH_WEIGHT = 3
+# chat_stats counter document holding the totals over every user
+GLOBAL_STATS_ID = '__all__'
+# Index that serves list_sessions for one user
+SESSION_LIST_INDEX = 'user_id_1_updated_at_-1_session_id_-1'
+# list_sessions order; session_id breaks ties between equal update times
+SESSION_LIST_SORT = [('updated_at', DESCENDING), ('session_id', DESCENDING)]
+# Fields read when listing sessions (never the messages)
+SESSION_LIST_FIELDS = {'_id': 0, 'session_id': 1, 'title': 1, 'message_count': 1, 'updated_at': 1}
+# Session documents are read without messages; the empty slice still shows which
+# documents embed them (stored before messages moved to chat_messages)
+SESSION_FIELDS = {'messages': {'$slice': 0}}
+# Sessions kept in memory per manager (least recently used are dropped first)
+DEFAULT_SESSION_CACHE_SIZE = 8
+
+def utc_now():
+    """Current time as a UTC datetime (stored as a BSON date)"""
+    return datetime.now(timezone.utc)
+
+
+def to_iso(value):
+    """ISO string for the API and CLI (dates not yet migrated are strings already)"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def parse_time(value):
+    """UTC datetime from an ISO string such as a list cursor; naive values are taken as UTC"""
+    if not isinstance(value, str):
+        return value
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def list_cursor(entry):
+    """Cursor for the sessions listed after a list_sessions entry: 'updated_at|session_id'"""
+    return f"{entry['updated_at']}|{entry['id']}"
+
+
+def parse_list_cursor(cursor):
+    """(updated_at, session_id) from a list cursor; session_id is None for a bare updated_at"""
+    updated_at, _, session_id = cursor.rpartition('|')
+    if not updated_at:
+        return cursor, None
+    return updated_at, session_id
+
+
+def ensure_indexes(db):
+    """Create the chat collections' indexes (no-op for the ones that exist)"""
+    sessions, messages = db['chat_sessions'], db['chat_messages']
+    sessions.create_index('session_id', unique=True)
+    # Listing a user's sessions newest first: equality on user_id, then the
+    # index order replaces an in-memory sort (it also serves user_id lookups)
+    sessions.create_index([('user_id', ASCENDING)] + SESSION_LIST_SORT)
+    sessions.create_index(SESSION_LIST_SORT)
+    messages.create_index([('session_id', ASCENDING), ('seq', ASCENDING)], unique=True)
+    # Full-text search (embedded messages are sessions stored before paging)
+    sessions.create_index(
+        [('title', TEXT), ('messages.content', TEXT)],
+        weights={'title': TITLE_SEARCH_WEIGHT}, name='session_text'
+    )
+    messages.create_index([('messages.content', TEXT)], name='message_text')
+
+
 class ChatSession:
     """Represents a single chat session"""
     def __init__(self, session_id, title="New Chat", user_id=None):
         self.session_id = session_id
         self.title = title
         self.user_id = user_id
-        self.messages = []
-        self.created_at = datetime.now().isoformat()
+        self._messages = []
+        # Loads the messages on first access (sessions read from MongoDB)
+        self._loader = None
+        # Until then: loads the last n stored messages for the history buffer,
+        # loads stored messages[start:end] for older turns (summaries),
+        # and messages added since the session was read are kept in _appended
+        self._tail_loader = None
+        self._range_loader = None
+        self._history_loaded = True
+        self._base_count = 0
+        self._appended = []
+        # Guards the switch from _appended to a loaded list against readers on other threads
+        self._lock = threading.RLock()
+        # Ring buffer of formatted recent turns, kept in step with messages
+        self.history_buffer = deque(maxlen=HISTORY_BUFFER_SIZE)
+        self.created_at = utc_now()
         self.updated_at = self.created_at
         self.is_first_message = True
+        # Rolling summary of messages[:summarized_count], sent instead of those turns
+        self.summary = None
+        self.summarized_count = 0
+        self.summary_pending = False
+        # message_count when the last summary update failed (retried summary_every turns later)
+        self.summary_failed_at = None
+        # Messages already stored in MongoDB; only newer ones are pushed on save
+        self.saved_count = 0
+        # Set when the stored messages must be replaced as a whole (new or cleared)
+        self.needs_rewrite = True
+        # Whether the session document exists in MongoDB (and in the chat_stats counters)
+        self.stored = False
+    
+    @property
+    def messages(self):
+        if self._messages is None:
+            with self._lock:
+                if self._messages is None:
+                    self._messages = self._loader()[:self._base_count] + self._appended
+                    self._appended = []
+                    self._rebuild_history_buffer()
+                    self._history_loaded = True
+        return self._messages
+    
+    @messages.setter
+    def messages(self, messages):
+        self._messages = messages
+    
+    @property
+    def is_loaded(self):
+        return self._messages is not None
+    
+    @property
+    def loaded_messages(self):
+        """The message list, or None while it has not been loaded"""
+        return self._messages
+    
+    @property
+    def message_count(self):
+        """Number of messages, without loading them"""
+        if self._messages is not None:
+            return len(self._messages)
+        return self._base_count + len(self._appended)
+    
+    def message_slice(self, start, end):
+        """messages[start:end] for positions added since the session was read, without loading older ones"""
+        with self._lock:
+            if self._messages is not None:
+                return self._messages[start:end]
+            return self._appended[start - self._base_count:end - self._base_count]
+    
+    def _load_history(self):
+        """Fill the history buffer from the newest stored messages only"""
+        if not self._history_loaded:
+            tail = self._tail_loader(HISTORY_BUFFER_SIZE)[-HISTORY_BUFFER_SIZE:]
+            self.history_buffer = deque(
+                (self.format_message(msg) for msg in tail + self._appended),
+                maxlen=HISTORY_BUFFER_SIZE
+            )
+            self._history_loaded = True
     
     def add_message(self, role, content):
         """Add a message to the session"""
-        self.messages.append({
+        message = {
             'role': role,
             'content': content,
-            'timestamp': datetime.now().isoformat()
-        })
-        self.updated_at = datetime.now().isoformat()
+            'timestamp': utc_now()
+        }
+        with self._lock:
+            if self.is_loaded:
+                self._messages.append(message)
+            else:
+                self._load_history()
+                self._appended.append(message)
+            self.history_buffer.append(self.format_message(message))
+        self.updated_at = utc_now()
         
         # Auto-generate title from first user message
-        if role == 'user' and len(self.messages) <= 2 and self.title == "New Chat":
+        if role == 'user' and self.message_count <= 2 and self.title == "New Chat":
             self.title = content[:50] + ("..." if len(content) > 50 else "")
     
-    def get_conversation_history(self):
-        """Get formatted conversation history"""
-        history = []
-        for msg in self.messages:
-            if msg['role'] == 'user':
-                history.append(f"Student: {msg['content']}")
-            else:
-                history.append(f"Assistant: {msg['content']}")
-        return history
+    def get_conversation_history(self, start=0, end=None):
+        """
+        Get formatted conversation history (messages[start:end])
+        
+        An unloaded session reads only the stored pages holding that range,
+        so this is safe to call from a background thread.
+        """
+        with self._lock:
+            messages = self._messages
+            if messages is None:
+                base = self._base_count
+                end = base + len(self._appended) if end is None else end
+                appended = self._appended[max(start - base, 0):max(end - base, 0)]
+        if messages is not None:
+            messages = messages[start:end]
+        else:
+            stored = self._range_loader(start, min(end, base)) if start < base else []
+            messages = stored + appended
+        return [self.format_message(msg) for msg in messages]
+    
+    @staticmethod
+    def format_message(msg):
+        """Prompt line of a stored message"""
+        if msg['role'] == 'user':
+            return f"Student: {msg['content']}"
+        return f"Assistant: {msg['content']}"
+    
+    def _rebuild_history_buffer(self):
+        self.history_buffer = deque(
+            (self.format_message(msg) for msg in self.messages[-HISTORY_BUFFER_SIZE:]),
+            maxlen=HISTORY_BUFFER_SIZE
+        )
+    
+    def recent_history(self, count=HISTORY_BUFFER_SIZE):
+        """Last formatted turns (at most HISTORY_BUFFER_SIZE) without touching older messages"""
+        if count <= 0:
+            return []
+        self._load_history()
+        return list(self.history_buffer)[-count:]
+    
+    def clear(self):
+        """Drop all messages and everything derived from them"""
+        with self._lock:
+            self.messages = []
+            self._appended = []
+            self._base_count = 0
+            self._history_loaded = True
+            self.history_buffer.clear()
+        self.is_first_message = True
+        self.summary = None
+        self.summarized_count = 0
+        self.summary_failed_at = None
+        self.needs_rewrite = True
+    
+    def metadata(self):
+        """Fields besides messages that change as the session is used"""
+        return {
+            'title': self.title,
+            'updated_at': self.updated_at,
+            'is_first_message': self.is_first_message,
+            'summary': self.summary,
+            'summarized_count': self.summarized_count,
+            'message_count': self.message_count
+        }
     
     def to_dict(self):
-        """Convert session to dictionary for MongoDB"""
+        """Convert session to dictionary for MongoDB (messages are stored in pages)"""
         return {
             'session_id': self.session_id,
             'title': self.title,
             'user_id': self.user_id,
-            'messages': self.messages,
+            'message_count': self.message_count,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
-            'is_first_message': self.is_first_message
+            'is_first_message': self.is_first_message,
+            'summary': self.summary,
+            'summarized_count': self.summarized_count
         }
     
     @staticmethod
-    def from_dict(data):
-        """Create session from dictionary"""
+    def from_dict(data, loader=None, tail_loader=None, range_loader=None):
+        """
+        Create session from dictionary
+        
+        Args:
+            data: Session document (messages embedded, or counted in message_count)
+            loader: Callable returning the messages, called on first access
+            tail_loader: Callable n -> last n messages, used for the history buffer
+            range_loader: Callable (start, end) -> messages[start:end], used for older turns
+        """
         session = ChatSession(data['session_id'], data['title'], data.get('user_id'))
-        session.messages = data['messages']
+        if loader is not None:
+            session.messages = None
+            session._loader = loader
+            session._tail_loader = tail_loader or (lambda count: loader()[-count:])
+            session._range_loader = range_loader or (lambda start, end: loader()[start:end])
+            session._history_loaded = False
+            session._base_count = data.get('message_count', 0)
+        else:
+            session.messages = data.get('messages', [])
+            session._rebuild_history_buffer()
         session.created_at = data['created_at']
         session.updated_at = data['updated_at']
         session.is_first_message = data.get('is_first_message', False)
+        session.summary = data.get('summary')
+        session.summarized_count = data.get('summarized_count', 0)
+        session.saved_count = data.get('message_count', 0) if loader is not None else len(session.messages)
+        session.needs_rewrite = False
+        session.stored = True
         return session
 
 
 class ChatManagerMongoDB:
     """Manages multiple chat sessions using MongoDB"""
     
-    def __init__(self, connection_string='mongodb://localhost:27017/', db_name='fyp_buddy', user_id=None):
+    def __init__(self, connection_string='mongodb://localhost:27017/', db_name='fyp_buddy', user_id=None,
+                 write_behind=None, max_pending=None, cache_size=None):
         """
         Initialize MongoDB connection
         
@@ -75,28 +317,46 @@ class ChatManagerMongoDB:
             connection_string: MongoDB connection string
             db_name: Database name to use
             user_id: User ID for session isolation
+            write_behind: Seconds saves may be buffered before flushing (0 = write immediately)
+            max_pending: Dirty sessions that force an early flush
+            cache_size: Sessions kept in memory
         """
         self.connection_string = connection_string
         self.db_name = db_name
         self.user_id = user_id
-        self.sessions = {}
+        # Least recently used first; see _cache_session
+        self.sessions = OrderedDict()
+        self.cache_size = cache_size or int(os.getenv('CHAT_SESSION_CACHE_SIZE', DEFAULT_SESSION_CACHE_SIZE))
         self.current_session_id = None
         
+        # Write-behind buffer: session_id -> (session, whether the document must be replaced);
+        # the session itself is kept so a flush never depends on it still being cached
+        self.write_behind = write_behind if write_behind is not None else float(
+            os.getenv('CHAT_WRITE_BEHIND_SECONDS', DEFAULT_WRITE_BEHIND_SECONDS))
+        self.max_pending = max_pending or int(
+            os.getenv('CHAT_WRITE_BEHIND_MAX_PENDING', DEFAULT_WRITE_BEHIND_MAX_PENDING))
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_now = threading.Event()
+        
         # Connect to MongoDB
         try:
             self.client = MongoClient(
                 connection_string,
-                serverSelectionTimeoutMS=5000  # 5 second timeout
+                serverSelectionTimeoutMS=5000,  # 5 second timeout
+                tz_aware=True  # dates come back as UTC datetimes
             )
             # Test connection
             self.client.server_info()
             self.db = self.client[db_name]
             self.collection = self.db['chat_sessions']
+            self.messages_collection = self.db['chat_messages']
+            # Session and message counters per user (and GLOBAL_STATS_ID), kept by every write
+            self.stats_collection = self.db['chat_stats']
             
             # Create indexes for better performance
-            self.collection.create_index('session_id', unique=True)
-            self.collection.create_index([('updated_at', DESCENDING)])
-            self.collection.create_index('user_id')
+            ensure_indexes(self.db)
             
             print(f"✅ Connected to MongoDB: {db_name}")
             
@@ -107,6 +367,10 @@ class ChatManagerMongoDB:
         
         # Load sessions from MongoDB
         self.load_sessions()
+        
+        if self.write_behind:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+            atexit.register(self.flush)
     
     def create_session(self, title="New Chat"):
         """Create a new chat session"""
@@ -119,8 +383,9 @@ class ChatManagerMongoDB:
             session_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         
         session = ChatSession(session_id, title, self.user_id)
-        self.sessions[session_id] = session
         self.current_session_id = session_id
+        self._cache_session(session)
+        # Counted by _write once it is stored
         self.save_session(session_id)
         return session_id
     
@@ -133,91 +398,344 @@ class ChatManagerMongoDB:
     
     def switch_session(self, session_id):
         """Switch to a different session"""
-        if session_id in self.sessions:
-            self.current_session_id = session_id
-            return True
+        if session_id != self.current_session_id:
+            self.flush()
         
-        # Try loading from MongoDB if not in memory
-        session_data = self.collection.find_one({'session_id': session_id})
-        if session_data:
-            session = ChatSession.from_dict(session_data)
-            self.sessions[session_id] = session
-            self.current_session_id = session_id
-            return True
+        # Loaded from MongoDB (without its messages) if not in memory
+        if self._get_session(session_id) is None:
+            return False
+        self.current_session_id = session_id
+        return True
+    
+    def _get_session(self, session_id):
+        """Session from the cache or from MongoDB, marked most recently used; None if missing"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session_data = self.collection.find_one({'session_id': session_id}, SESSION_FIELDS)
+            if not session_data:
+                return None
+            session = self._session_from_doc(session_data)
+        self._cache_session(session)
+        return session
+    
+    def _cache_session(self, session):
+        """Add or touch a session, dropping the least recently used ones over cache_size"""
+        self.sessions[session.session_id] = session
+        self.sessions.move_to_end(session.session_id)
         
-        return False
+        evictable = [
+            session_id for session_id, cached in self.sessions.items()
+            if session_id != self.current_session_id and not cached.summary_pending
+        ]
+        excess = len(self.sessions) - self.cache_size
+        if excess <= 0 or not evictable:
+            return
+        evicted = evictable[:excess]
+        # Unsaved changes are written before the session leaves memory
+        with self._dirty_lock:
+            dirty = any(session_id in self._dirty for session_id in evicted)
+        if dirty:
+            self.flush()
+        for session_id in evicted:
+            del self.sessions[session_id]
     
     def delete_session(self, session_id):
         """Delete a chat session"""
-        if session_id in self.sessions:
-            # Delete from MongoDB
+        session = self._get_session(session_id)
+        if session is None:
+            return False
+        
+        # Delete from MongoDB (after any flush in flight, which could recreate it)
+        with self._flush_lock:
+            with self._dirty_lock:
+                self._dirty.pop(session_id, None)
             self.collection.delete_one({'session_id': session_id})
-            
-            # Remove from memory
-            del self.sessions[session_id]
-            
-            # Switch to another session if current was deleted
-            if self.current_session_id == session_id:
-                if self.sessions:
-                    self.current_session_id = list(self.sessions.keys())[-1]
-                else:
-                    self.current_session_id = None
-            return True
-        return False
+            self.messages_collection.delete_many({'session_id': session_id})
+            self._count(sessions=-1 if session.stored else 0, messages=-session.saved_count)
+        
+        # Remove from memory
+        del self.sessions[session_id]
+        
+        # Switch to another session if current was deleted
+        if self.current_session_id == session_id:
+            if self.sessions:
+                self.current_session_id = list(self.sessions.keys())[-1]
+            else:
+                self.current_session_id = None
+        return True
     
-    def list_sessions(self):
-        """List all sessions sorted by update time"""
-        # Get all sessions from MongoDB for this user only
+    def list_sessions(self, limit=None, before=None):
+        """
+        List sessions sorted by update time, newest first
+        
+        Only metadata is read (served by the (user_id, updated_at, session_id) index).
+        
+        Args:
+            limit: Maximum number of sessions (None for all)
+            before: list_cursor() of the last listed session, to get the next page
+                    (a bare updated_at ISO string is also accepted)
+        """
+        self.flush()
+        # Sessions of this user only
         query = {'user_id': self.user_id} if self.user_id else {}
-        all_sessions = list(self.collection.find(query).sort('updated_at', DESCENDING))
+        if before is not None:
+            updated_at, session_id = parse_list_cursor(before)
+            updated_at = parse_time(updated_at)
+            if session_id is None:
+                query['updated_at'] = {'$lt': updated_at}
+            else:
+                # Sessions updated in the same millisecond continue by session_id
+                query['$or'] = [
+                    {'updated_at': {'$lt': updated_at}},
+                    {'updated_at': updated_at, 'session_id': {'$lt': session_id}}
+                ]
+        cursor = self.collection.find(query, SESSION_LIST_FIELDS).sort(SESSION_LIST_SORT)
+        if limit:
+            cursor = cursor.limit(limit)
         
         sessions_list = []
-        for session_data in all_sessions:
+        for session_data in cursor:
             sessions_list.append({
                 'id': session_data['session_id'],
                 'title': session_data['title'],
-                'message_count': len(session_data['messages']),
-                'updated_at': session_data['updated_at'],
+                'message_count': self._message_count(session_data),
+                'updated_at': to_iso(session_data['updated_at']),
                 'is_current': session_data['session_id'] == self.current_session_id
             })
         
         return sessions_list
     
-    def save_session(self, session_id):
-        """Save a session to MongoDB"""
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            # Use upsert to insert or update
-            self.collection.update_one(
-                {'session_id': session_id},
-                {'$set': session.to_dict()},
+    def save_session(self, session_id, rewrite=False):
+        """
+        Save a session to MongoDB
+        
+        Normally only the messages added since the last save are pushed to
+        their pages, so each turn writes the same few bytes however long the
+        session is. In write-behind mode the session is only marked dirty and
+        the background flusher writes it.
+        
+        Args:
+            session_id: Session to save
+            rewrite: Replace the whole session document (clear, rename)
+        """
+        if session_id not in self.sessions:
+            return
+        
+        if self.write_behind:
+            with self._dirty_lock:
+                _, queued_rewrite = self._dirty.get(session_id, (None, False))
+                self._dirty[session_id] = (self.sessions[session_id], queued_rewrite or rewrite)
+                pending = len(self._dirty)
+            if pending >= self.max_pending:
+                self._flush_now.set()
+            return
+        
+        self._write([self._session_writes(self.sessions[session_id], rewrite)])
+    
+    def _session_writes(self, session, rewrite):
+        """Operations that bring the stored copy of a session up to date"""
+        # Compared after the write to detect a clear() in the meantime
+        messages = session.loaded_messages
+        count = session.message_count
+        message_ops = []
+        
+        if session.needs_rewrite:
+            if session.saved_count:
+                message_ops.append(DeleteMany({'session_id': session.session_id}))
+            start, rewrite = 0, True
+        else:
+            start = session.saved_count
+        
+        pages = {}
+        for position, message in enumerate(session.message_slice(start, count), start):
+            pages.setdefault(position // MESSAGE_PAGE_SIZE, []).append(message)
+        message_ops += [
+            UpdateOne(
+                {'session_id': session.session_id, 'seq': seq},
+                {'$push': {'messages': {'$each': page}},
+                 '$setOnInsert': {'user_id': session.user_id}},
                 upsert=True
             )
+            for seq, page in sorted(pages.items())
+        ]
+        
+        if rewrite:
+            # Use upsert to insert or update
+            session_op = ReplaceOne({'session_id': session.session_id}, session.to_dict(), upsert=True)
+        else:
+            session_op = UpdateOne({'session_id': session.session_id}, {'$set': session.metadata()})
+        return session, messages, count, message_ops, session_op
+    
+    def _write(self, writes):
+        """Apply _session_writes results with one bulk_write per collection"""
+        message_ops = [op for _, _, _, ops, _ in writes for op in ops]
+        if message_ops:
+            self.messages_collection.bulk_write(message_ops)
+        self.collection.bulk_write([session_op for _, _, _, _, session_op in writes])
+        
+        created = added = 0
+        for session, messages, count, _, _ in writes:
+            created += not session.stored
+            session.stored = True
+            added += count - session.saved_count
+            session.saved_count = count
+            # A session cleared while this write was in flight still needs its rewrite
+            if session.loaded_messages is messages:
+                session.needs_rewrite = False
+        self._count(sessions=created, messages=added)
+    
+    def flush(self):
+        """Write every session changed since the last flush (write-behind mode)"""
+        with self._flush_lock:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, {}
+            writes = [self._session_writes(session, rewrite) for session, rewrite in dirty.values()]
+            if not writes:
+                return
+            try:
+                self._write(writes)
+            except Exception:
+                # Keep them dirty for the next flush
+                with self._dirty_lock:
+                    for session_id, (session, rewrite) in dirty.items():
+                        # A save queued meanwhile keeps its session, the flag accumulates
+                        queued, queued_rewrite = self._dirty.get(session_id, (session, False))
+                        self._dirty[session_id] = (queued, queued_rewrite or rewrite)
+                raise
+    
+    def _flush_loop(self):
+        while True:
+            self._flush_now.wait(self.write_behind)
+            self._flush_now.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Chat write-behind flush failed: {e}", file=sys.stderr)
+    
+    def _session_from_doc(self, data):
+        """ChatSession from a chat_sessions document; messages are read from their pages on first use"""
+        session_id = data['session_id']
+        if 'messages' in data:
+            # Stored before messages moved to chat_messages; the next save moves them
+            if not data['messages']:
+                data = self.collection.find_one({'session_id': session_id})
+            session = ChatSession.from_dict(data)
+            session.needs_rewrite = True
+            return session
+        return ChatSession.from_dict(
+            data,
+            loader=lambda: self._load_messages(session_id),
+            tail_loader=lambda count: self.get_recent_messages(session_id, count),
+            range_loader=lambda start, end: self.get_message_range(session_id, start, end)
+        )
+    
+    def get_recent_messages(self, session_id, count):
+        """
+        Last count messages of a session, reading only the newest pages
+        
+        Resuming a long conversation for a prompt costs the same as a short one.
+        """
+        session = self.sessions.get(session_id)
+        if session is not None and session.is_loaded:
+            return session.messages[-count:] if count > 0 else []
+        if count <= 0:
+            return []
+        # The newest page may hold a single message, so one extra page covers count
+        pages = list(self.messages_collection.find({'session_id': session_id}, {'messages': 1})
+                     .sort('seq', DESCENDING).limit(-(-count // MESSAGE_PAGE_SIZE) + 1))
+        return [message for page in reversed(pages) for message in page['messages']][-count:]
+    
+    def get_message_range(self, session_id, start, end):
+        """Stored messages[start:end] of a session, reading only the pages that hold them"""
+        if end <= start:
+            return []
+        first = start // MESSAGE_PAGE_SIZE
+        pages = self.messages_collection.find(
+            {'session_id': session_id,
+             'seq': {'$gte': first, '$lte': (end - 1) // MESSAGE_PAGE_SIZE}},
+            {'messages': 1}
+        ).sort('seq', ASCENDING)
+        messages = [message for page in pages for message in page['messages']]
+        offset = start - first * MESSAGE_PAGE_SIZE
+        return messages[offset:offset + end - start]
+    
+    def _load_messages(self, session_id):
+        """Every message of a session from its pages, oldest first"""
+        pages = self.messages_collection.find(
+            {'session_id': session_id}, {'messages': 1}
+        ).sort('seq', ASCENDING)
+        return [message for page in pages for message in page['messages']]
+    
+    @staticmethod
+    def _message_count(session_data):
+        if 'message_count' in session_data:
+            return session_data['message_count']
+        return len(session_data.get('messages', []))
+    
+    def get_messages(self, session_id, cursor=None, pages=1):
+        """
+        Page through a session's messages, newest page first
+        
+        Args:
+            session_id: Session to read
+            cursor: next_cursor from the previous call (None for the latest page)
+            pages: Number of pages of MESSAGE_PAGE_SIZE messages to return
+        
+        Returns:
+            {'messages': [...oldest first], 'next_cursor': cursor for older messages or None}
+        """
+        session = self.sessions.get(session_id)
+        if session is None or not session.is_loaded:
+            # Buffered appends of an unloaded session exist only in the write-behind queue
+            self.flush()
+            query = {'session_id': session_id}
+            if cursor is not None:
+                query['seq'] = {'$lt': cursor}
+            docs = list(self.messages_collection.find(query, {'seq': 1, 'messages': 1})
+                        .sort('seq', DESCENDING).limit(pages))
+            if docs or cursor is not None:
+                docs.reverse()
+                return {
+                    'messages': [message for doc in docs for message in doc['messages']],
+                    'next_cursor': docs[0]['seq'] or None if docs else None
+                }
+            # Empty, or stored before messages moved to pages
+            session_data = self.collection.find_one({'session_id': session_id})
+            if not session_data:
+                return {'messages': [], 'next_cursor': None}
+            session = self._session_from_doc(session_data)
+        
+        # Loaded in memory, including messages not saved yet
+        end_page = -(-len(session.messages) // MESSAGE_PAGE_SIZE) if cursor is None else cursor
+        first_page = max(end_page - pages, 0)
+        return {
+            'messages': session.messages[first_page * MESSAGE_PAGE_SIZE:end_page * MESSAGE_PAGE_SIZE],
+            'next_cursor': first_page or None
+        }
     
     def load_sessions(self):
         """Load recent sessions from MongoDB into memory"""
-        # Load only the 10 most recent sessions for this user to save memory
+        # Only the most recent sessions for this user, and only their metadata;
+        # messages are read when a session is first used
         query = {'user_id': self.user_id} if self.user_id else {}
-        recent_sessions = self.collection.find(query).sort('updated_at', DESCENDING).limit(10)
+        recent_sessions = list(
+            self.collection.find(query, SESSION_FIELDS).sort('updated_at', DESCENDING).limit(self.cache_size)
+        )
         
-        for session_data in recent_sessions:
-            session = ChatSession.from_dict(session_data)
+        # Oldest first, so the most recent session is the most recently used
+        for session_data in reversed(recent_sessions):
+            session = self._session_from_doc(session_data)
             self.sessions[session.session_id] = session
         
         # Set current session to most recently updated
-        if self.sessions:
-            sorted_sessions = sorted(
-                self.sessions.items(),
-                key=lambda x: x[1].updated_at,
-                reverse=True
-            )
-            self.current_session_id = sorted_sessions[0][0]
+        if recent_sessions:
+            self.current_session_id = recent_sessions[0]['session_id']
     
     def rename_session(self, session_id, new_title):
         """Rename a chat session"""
         if session_id in self.sessions:
             self.sessions[session_id].title = new_title
-            self.save_session(session_id)
+            self.save_session(session_id, rewrite=True)
             return True
         
         # Try updating in MongoDB directly
@@ -230,45 +748,126 @@ class ChatManagerMongoDB:
     def clear_current_session(self):
         """Clear messages in current session"""
         session = self.get_current_session()
-        session.messages = []
-        session.is_first_message = True
-        self.save_session(session.session_id)
-    
-    def get_stats(self):
-        """Get statistics about chat sessions"""
-        total_sessions = self.collection.count_documents({})
-        total_messages = sum(
-            len(session.get('messages', [])) 
-            for session in self.collection.find()
+        session.clear()
+        self.save_session(session.session_id, rewrite=True)
+    
+    def _count(self, sessions=0, messages=0):
+        """Move this user's and the global counters (only once get_stats has created them)"""
+        if not sessions and not messages:
+            return
+        scopes = [GLOBAL_STATS_ID] + ([self.user_id] if self.user_id else [])
+        self.stats_collection.update_many(
+            {'_id': {'$in': scopes}},
+            {'$inc': {'sessions': sessions, 'messages': messages}}
+        )
+    
+    def _rebuild_stats(self, scope):
+        """
+        Count a scope's sessions and messages once on the server and store the counters
+        
+        The counter document is created first so _count calls made while the
+        aggregation runs are not lost; the ones already applied before it
+        started are subtracted, as the aggregation sees their writes too.
+        Only the caller that created the document counts, so concurrent
+        rebuilds do not add the totals twice.
+        """
+        match = {} if scope == GLOBAL_STATS_ID else {'user_id': scope}
+        created = self.stats_collection.update_one(
+            {'_id': scope},
+            {'$setOnInsert': {'sessions': 0, 'messages': 0}},
+            upsert=True
         )
+        if created.upserted_id is None:
+            return self.stats_collection.find_one({'_id': scope})
+        before = self.stats_collection.find_one({'_id': scope})
+        totals = next(self.collection.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': None,
+                'sessions': {'$sum': 1},
+                # Sessions saved before message_count existed still embed their messages
+                'messages': {'$sum': {'$ifNull': [
+                    '$message_count', {'$size': {'$ifNull': ['$messages', []]}}
+                ]}}
+            }}
+        ]), {'sessions': 0, 'messages': 0})
+        return self.stats_collection.find_one_and_update(
+            {'_id': scope},
+            {'$inc': {'sessions': totals['sessions'] - before['sessions'],
+                      'messages': totals['messages'] - before['messages']}},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def get_stats(self, all_users=False):
+        """
+        Get statistics about chat sessions
+        
+        Read from counters kept up to date by every write, so the cost does
+        not grow with the database.
+        
+        Args:
+            all_users: Totals over every user (admin view) instead of this user's
+        """
+        self.flush()
+        scope = GLOBAL_STATS_ID if all_users or not self.user_id else self.user_id
+        counters = self.stats_collection.find_one({'_id': scope}) or self._rebuild_stats(scope)
         
         return {
-            'total_sessions': total_sessions,
-            'total_messages': total_messages,
-            'sessions_in_memory': len(self.sessions)
+            'total_sessions': counters['sessions'],
+            'total_messages': counters['messages'],
+            'sessions_in_memory': len(self.sessions),
+            'scope': 'all' if scope == GLOBAL_STATS_ID else 'user'
         }
     
-    def search_sessions(self, query):
-        """Search sessions by title or content"""
-        results = self.collection.find({
-            '$or': [
-                {'title': {'$regex': query, '$options': 'i'}},
-                {'messages.content': {'$regex': query, '$options': 'i'}}
-            ]
-        }).sort('updated_at', DESCENDING)
+    def search_sessions(self, query, limit=20, offset=0):
+        """
+        Search this user's sessions by title and message content
+        
+        Uses the text indexes, so only matching documents are read. Sessions
+        are ranked by their title score plus the scores of their matching
+        message pages.
+        
+        Args:
+            query: Words or "quoted phrases" to look for
+            limit: Maximum number of results
+            offset: Results to skip (for the next page pass offset + limit)
+        """
+        self.flush()
+        scope = {'user_id': self.user_id} if self.user_id else {}
+        text = {'$text': {'$search': query}}
+        
+        scores = {}
+        for page in self.messages_collection.aggregate([
+            {'$match': {**text, **scope}},
+            {'$group': {'_id': '$session_id', 'score': {'$sum': {'$meta': 'textScore'}}}}
+        ]):
+            scores[page['_id']] = page['score']
+        for session_data in self.collection.find({**text, **scope}, {'session_id': 1, 'score': {'$meta': 'textScore'}}):
+            session_id = session_data['session_id']
+            scores[session_id] = scores.get(session_id, 0) + session_data['score']
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[offset:offset + limit]
+        sessions = {
+            session_data['session_id']: session_data
+            for session_data in self.collection.find(
+                {'session_id': {'$in': [session_id for session_id, _ in ranked]}}, SESSION_LIST_FIELDS
+            )
+        }
         
         return [
             {
-                'id': session['session_id'],
-                'title': session['title'],
-                'message_count': len(session['messages']),
-                'updated_at': session['updated_at']
+                'id': session_id,
+                'title': sessions[session_id]['title'],
+                'message_count': self._message_count(sessions[session_id]),
+                'updated_at': to_iso(sessions[session_id]['updated_at']),
+                'score': round(score, 3)
             }
-            for session in results
+            for session_id, score in ranked if session_id in sessions
         ]
     
     def close(self):
         """Close MongoDB connection"""
         if hasattr(self, 'client'):
+            self.flush()
             self.client.close()
             print("✅ MongoDB connection closed")
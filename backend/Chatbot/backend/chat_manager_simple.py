@@ -5,32 +5,75 @@ import json
 import os
 from datetime import datetime
 import uuid
+from collections import deque
+from chat_manager_mongodb import TITLE_SEARCH_WEIGHT, parse_list_cursor
+
+# Formatted recent turns kept ready on every session for prompt building
+HISTORY_BUFFER_SIZE = 16
+# Messages per page returned by get_messages (same paging as the MongoDB manager)
+MESSAGE_PAGE_SIZE = 50
 
 class ChatSession:
     def __init__(self, session_id, title="New Chat"):
         self.session_id = session_id
         self.title = title
         self.messages = []
+        # Ring buffer of formatted recent turns, kept in step with messages
+        self.history_buffer = deque(maxlen=HISTORY_BUFFER_SIZE)
         self.created_at = datetime.now().isoformat()
         self.updated_at = datetime.now().isoformat()
         self.is_first_message = True
+        # Rolling summary of messages[:summarized_count], sent instead of those turns
+        self.summary = None
+        self.summarized_count = 0
+        self.summary_pending = False
+        # message_count when the last summary update failed (retried summary_every turns later)
+        self.summary_failed_at = None
+    
+    @property
+    def message_count(self):
+        return len(self.messages)
     
     def add_message(self, role, content):
-        self.messages.append({
+        message = {
             'role': role,
             'content': content,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        self.messages.append(message)
+        self.history_buffer.append(self.format_message(message))
         self.updated_at = datetime.now().isoformat()
     
-    def get_conversation_history(self):
-        history = []
-        for msg in self.messages:
-            if msg['role'] == 'user':
-                history.append(f"Student: {msg['content']}")
-            else:
-                history.append(f"Assistant: {msg['content']}")
-        return history
+    def get_conversation_history(self, start=0, end=None):
+        return [self.format_message(msg) for msg in self.messages[start:end]]
+    
+    @staticmethod
+    def format_message(msg):
+        """Prompt line of a stored message"""
+        if msg['role'] == 'user':
+            return f"Student: {msg['content']}"
+        return f"Assistant: {msg['content']}"
+    
+    def _rebuild_history_buffer(self):
+        self.history_buffer = deque(
+            (self.format_message(msg) for msg in self.messages[-HISTORY_BUFFER_SIZE:]),
+            maxlen=HISTORY_BUFFER_SIZE
+        )
+    
+    def recent_history(self, count=HISTORY_BUFFER_SIZE):
+        """Last formatted turns (at most HISTORY_BUFFER_SIZE) without touching older messages"""
+        if count <= 0:
+            return []
+        return list(self.history_buffer)[-count:]
+    
+    def clear(self):
+        """Drop all messages and everything derived from them"""
+        self.messages = []
+        self.history_buffer.clear()
+        self.is_first_message = True
+        self.summary = None
+        self.summarized_count = 0
+        self.summary_failed_at = None
     
     def to_dict(self):
         return {
@@ -38,16 +81,21 @@ class ChatSession:
             'title': self.title,
             'messages': self.messages,
             'created_at': self.created_at,
-            'updated_at': self.updated_at
+            'updated_at': self.updated_at,
+            'summary': self.summary,
+            'summarized_count': self.summarized_count
         }
     
     @staticmethod
     def from_dict(data):
         session = ChatSession(data['session_id'], data['title'])
         session.messages = data.get('messages', [])
+        session._rebuild_history_buffer()
         session.created_at = data.get('created_at', datetime.now().isoformat())
         session.updated_at = data.get('updated_at', datetime.now().isoformat())
         session.is_first_message = len(session.messages) == 0
+        session.summary = data.get('summary')
+        session.summarized_count = data.get('summarized_count', 0)
         return session
 
 class SimpleChatManager:
@@ -116,10 +164,15 @@ class SimpleChatManager:
             return True
         return False
     
-    def list_sessions(self):
-        """List all sessions"""
+    def list_sessions(self, limit=None, before=None):
+        """List sessions, newest first (limit/before page like ChatManagerMongoDB)"""
+        if before is not None:
+            updated_at, before_id = parse_list_cursor(before)
         sessions_list = []
         for session_id, session in self.sessions.items():
+            if before is not None and (session.updated_at > updated_at or session.updated_at == updated_at
+                                       and (before_id is None or session_id >= before_id)):
+                continue
             sessions_list.append({
                 'id': session_id,
                 'title': session.title,
@@ -129,9 +182,9 @@ class SimpleChatManager:
                 'is_current': session_id == self.current_session_id
             })
         
-        # Sort by updated_at (most recent first)
-        sessions_list.sort(key=lambda x: x['updated_at'], reverse=True)
-        return sessions_list
+        # Sort by updated_at (most recent first), ties by id like the cursor
+        sessions_list.sort(key=lambda x: (x['updated_at'], x['id']), reverse=True)
+        return sessions_list[:limit] if limit else sessions_list
     
     def delete_session(self, session_id):
         """Delete a session"""
@@ -162,21 +215,54 @@ class SimpleChatManager:
         """Save a specific session"""
         self.save_sessions()
     
+    def get_messages(self, session_id, cursor=None, pages=1):
+        """Page through a session's messages, newest page first (see ChatManagerMongoDB)"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return {'messages': [], 'next_cursor': None}
+        end_page = -(-len(session.messages) // MESSAGE_PAGE_SIZE) if cursor is None else cursor
+        first_page = max(end_page - pages, 0)
+        return {
+            'messages': session.messages[first_page * MESSAGE_PAGE_SIZE:end_page * MESSAGE_PAGE_SIZE],
+            'next_cursor': first_page or None
+        }
+    
     def clear_current_session(self):
         """Clear messages in current session"""
         session = self.get_current_session()
-        session.messages = []
-        session.is_first_message = True
+        session.clear()
         session.updated_at = datetime.now().isoformat()
         self.save_sessions()
     
-    def get_stats(self):
-        """Get statistics"""
+    def search_sessions(self, query, limit=20, offset=0):
+        """Search sessions by title and message words, ranked like ChatManagerMongoDB"""
+        words = set(query.lower().split())
+        ranked = []
+        for session_id, session in self.sessions.items():
+            score = TITLE_SEARCH_WEIGHT * sum(word in session.title.lower() for word in words)
+            score += sum(word in msg['content'].lower() for msg in session.messages for word in words)
+            if score:
+                ranked.append((score, session))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [
+            {
+                'id': session.session_id,
+                'title': session.title,
+                'message_count': len(session.messages),
+                'updated_at': session.updated_at,
+                'score': score
+            }
+            for score, session in ranked[offset:offset + limit]
+        ]
+    
+    def get_stats(self, all_users=False):
+        """Get statistics (one local file, so every view is the same)"""
         total_messages = sum(len(s.messages) for s in self.sessions.values())
         return {
             'total_sessions': len(self.sessions),
             'total_messages': total_messages,
-            'sessions_in_memory': len(self.sessions)
+            'sessions_in_memory': len(self.sessions),
+            'scope': 'all'
         }
     
     def close(self):
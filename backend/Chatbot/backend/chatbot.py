@@ -1,11 +1,13 @@
 import re
 import random
-import difflib
 import os
 import json
 import hashlib
 import time
-from train_bot import ProjectChatbotTrainer, cosine_similarity
+from train_bot import ProjectChatbotTrainer
+from prompt_builder import PromptBuilder
+from model_router import ModelRouter
+from local_answers import LocalAnswerEngine
 
 try:
     import google.generativeai as genai
@@ -14,121 +16,62 @@ except ImportError:
     GEMINI_AVAILABLE = False
     print("⚠️ google-generativeai not installed. Run: pip install google-generativeai")
 
-class GeminiProjectChatbotV2:
-    def __init__(self, api_key=None):
-        self.trainer = ProjectChatbotTrainer()
-        self.conversation_history = []
-        self.is_first_message = True
-        
-        # Performance optimization: Simple response cache
-        self.response_cache = {}
-        self.cache_hits = 0
-        self.cache_misses = 0
-        
-        # Initialize Gemini
-        self.use_gemini = False
-        if GEMINI_AVAILABLE and api_key:
-            try:
-                import sys
-                print(f"🔧 Configuring Gemini with API key (length: {len(api_key) if api_key else 0})...", file=sys.stderr)
-                genai.configure(api_key=api_key)
-                # Try different model names
-                # Don't test during init to save quota
-                model_names = ['gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-1.5-pro']
-                
-                for model_name in model_names:
-                    try:
-                        print(f"🔧 Trying model: {model_name}", file=sys.stderr)
-                        self.model = genai.GenerativeModel(model_name)
-                        # Skip test call to save quota
-                        self.use_gemini = True
-                        print(f"✅ Gemini AI initialized (using {model_name})", file=sys.stderr)
-                        break
-                    except Exception as model_error:
-                        print(f"⚠️ Model {model_name} failed: {model_error}", file=sys.stderr)
-                        if "not found" in str(model_error).lower():
-                            continue
-                        else:
-                            raise model_error
-                
-                if not self.use_gemini:
-                    print("❌ No compatible Gemini model found", file=sys.stderr)
-                    
-            except Exception as e:
-                import sys
-                print(f"❌ Gemini initialization failed: {e}", file=sys.stderr)
-                self.use_gemini = False
-        elif not GEMINI_AVAILABLE:
-            import sys
-            print("❌ google-generativeai package not available", file=sys.stderr)
-        elif not api_key:
-            import sys
-            print("❌ No API key provided to chatbot", file=sys.stderr)
-        else:
-            import sys
-            print("⚠️ Running in fallback mode (rule-based only)", file=sys.stderr)
 
-    def load_model(self):
-        try:
-            if not self.trainer.load_trained_model():
-                if self.trainer.load_data():
-                    self.trainer.prepare_project_vectors()
-                    self.trainer.save_trained_model()
-                else:
-                    raise Exception("Could not load data files")
-            
-            print(f"\n📋 Knowledge base loaded successfully")
-            return True
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            return False
+def project_details(p):
+    """Project fields shown to the model"""
+    return {
+        'name': p['name'],
+        'description': p['description'],
+        'department': p.get('department'),
+        'technologies': p.get('technologies', []),
+        'difficulty': p.get('difficulty'),
+        'duration': p.get('duration'),
+        'hardware': p.get('hardware'),
+        'beginner_friendly': p.get('beginner_friendly'),
+        'future_scope': p.get('future_scope')
+    }
 
-    def build_knowledge_base(self):
-        """Build a comprehensive knowledge base from your data"""
-        
-        knowledge = {
-            'projects': [],
-            'technologies': {},
-            'departments': set(),
-            'difficulties': set()
-        }
-        
-        # Extract all projects (keep department for filtering but don't display)
-        for p in self.trainer.projects:
-            knowledge['projects'].append({
-                'name': p['name'],
-                'description': p['description'],
-                'department': p.get('department'),
-                'technologies': p.get('technologies', []),
-                'difficulty': p.get('difficulty'),
-                'duration': p.get('duration'),
-                'hardware': p.get('hardware'),
-                'beginner_friendly': p.get('beginner_friendly'),
-                'future_scope': p.get('future_scope')
-            })
-            knowledge['departments'].add(p.get('department'))
-            knowledge['difficulties'].add(p.get('difficulty'))
-        
-        # Extract all technologies
-        for tech_name, tech_data in self.trainer.technologies.items():
-            knowledge['technologies'][tech_name] = {
-                'name': tech_data.get('name'),
-                'category': tech_data.get('category'),
-                'short_description': tech_data.get('short_description'),
-                'long_description': tech_data.get('long_description'),
-                'difficulty': tech_data.get('difficulty'),
-                'examples': tech_data.get('examples', []),
-                'more_info_link': tech_data.get('more_info_link')
-            }
-        
-        return knowledge
 
-    def create_system_prompt(self):
-        """Create a comprehensive system prompt with all your data"""
-        
-        knowledge = self.build_knowledge_base()
-        
-        prompt = f"""You are FYP BUDDY AI, an intelligent and friendly FYP (Final Year Project) assistant for NUML university students in Pakistan. You have access to a comprehensive database of projects and technologies to help students with their Final Year Projects.
+def technology_details(tech_data):
+    """Technology fields shown to the model"""
+    return {
+        'name': tech_data.get('name'),
+        'category': tech_data.get('category'),
+        'short_description': tech_data.get('short_description'),
+        'long_description': tech_data.get('long_description'),
+        'difficulty': tech_data.get('difficulty'),
+        'examples': tech_data.get('examples', []),
+        'more_info_link': tech_data.get('more_info_link')
+    }
+
+
+def build_knowledge_base(trainer):
+    """Build a comprehensive knowledge base from your data"""
+    knowledge = {
+        'projects': [],
+        'technologies': {},
+        'departments': set(),
+        'difficulties': set()
+    }
+    
+    # Extract all projects (keep department for filtering but don't display)
+    for p in trainer.projects:
+        knowledge['projects'].append(project_details(p))
+        knowledge['departments'].add(p.get('department'))
+        knowledge['difficulties'].add(p.get('difficulty'))
+    
+    # Extract all technologies
+    for tech_name, tech_data in trainer.technologies.items():
+        knowledge['technologies'][tech_name] = technology_details(tech_data)
+    
+    return knowledge
+
+
+def render_system_prompt(trainer):
+    """System prompt for a trainer; touches no bot state, so it can run off the request thread"""
+    knowledge = build_knowledge_base(trainer)
+    
+    prompt = f"""You are FYP BUDDY AI, an intelligent and friendly FYP (Final Year Project) assistant for NUML university students in Pakistan. You have access to a comprehensive database of projects and technologies to help students with their Final Year Projects.
 
 Your personality:
 - Friendly, helpful, and encouraging (like a buddy!)
@@ -196,36 +139,190 @@ CRITICAL DISPLAY RULE:
 
 Remember: You're not just a database lookup tool - you're an intelligent assistant that understands context, can make recommendations, and can have natural conversations about technology and projects!
 """
+    return prompt
+
+
+class GeminiProjectChatbotV2:
+    def __init__(self, api_key=None):
+        self.trainer = ProjectChatbotTrainer()
+        self.conversation_history = []
+        self.is_first_message = True
         
+        # Performance optimization: Simple response cache
+        # Entries are (response, knowledge_version); version None means the
+        # response does not depend on the knowledge base
+        self.response_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # (trainer, prompt) - the system prompt is rebuilt only when the trainer changes
+        self._system_prompt = None
+        
+        # Keeps every prompt within PROMPT_TOKEN_BUDGET; the split of the
+        # last prompt sent is kept for reporting (None for cached answers)
+        self.prompt_builder = PromptBuilder()
+        self.last_prompt_report = None
+        
+        # (trainer, engine) for retrieval-only answers when Gemini cannot be used
+        self._local_engine = None
+        self.last_answer_local = False
+        
+        # Initialize Gemini
+        self.use_gemini = False
+        if GEMINI_AVAILABLE and api_key:
+            try:
+                import sys
+                print(f"🔧 Configuring Gemini with API key (length: {len(api_key) if api_key else 0})...", file=sys.stderr)
+                genai.configure(api_key=api_key)
+                # Models in order of preference; requests fail over between them
+                # Don't test during init to save quota
+                model_names = os.getenv('GEMINI_MODELS', 'gemini-2.5-flash,gemini-1.5-flash,gemini-1.5-pro')
+                model_names = [name.strip() for name in model_names.split(',') if name.strip()]
+                
+                self.model = ModelRouter.shared(model_names, genai.GenerativeModel)
+                if len(self.model):
+                    self.use_gemini = True
+                    print(f"✅ Gemini AI initialized (routing across {', '.join(name for name, _ in self.model.models)})", file=sys.stderr)
+                
+                if not self.use_gemini:
+                    print("❌ No compatible Gemini model found", file=sys.stderr)
+                    
+            except Exception as e:
+                import sys
+                print(f"❌ Gemini initialization failed: {e}", file=sys.stderr)
+                self.use_gemini = False
+        elif not GEMINI_AVAILABLE:
+            import sys
+            print("❌ google-generativeai package not available", file=sys.stderr)
+        elif not api_key:
+            import sys
+            print("❌ No API key provided to chatbot", file=sys.stderr)
+        else:
+            import sys
+            print("⚠️ Running in fallback mode (rule-based only)", file=sys.stderr)
+
+    def load_model(self):
+        try:
+            if not self.trainer.load_trained_model():
+                if self.trainer.load_data():
+                    self.trainer.prepare_project_vectors()
+                    self.trainer.save_trained_model()
+                else:
+                    raise Exception("Could not load data files")
+            
+            print(f"\n📋 Knowledge base loaded successfully")
+            return True
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            return False
+
+    def use_trainer(self, trainer, system_prompt=None):
+        """Swap in a reloaded knowledge base and drop cache entries built on the old one"""
+        if system_prompt is None:
+            system_prompt = self.create_system_prompt(trainer)
+        self._system_prompt = (trainer, system_prompt)
+        self.trainer = trainer
+        self.invalidate_knowledge_cache()
+
+    def invalidate_knowledge_cache(self):
+        """Remove cached responses generated from a different knowledge version"""
+        version = self.trainer.knowledge_version()
+        for key, (_, entry_version) in list(self.response_cache.items()):
+            if entry_version is not None and entry_version != version:
+                self.response_cache.pop(key, None)
+
+    def build_knowledge_base(self, trainer=None):
+        """Build a comprehensive knowledge base from your data"""
+        return build_knowledge_base(trainer or self.trainer)
+
+    def build_relevant_context(self, user_input, trainer=None):
+        """Knowledge looked up locally for this message, added to the prompt"""
+        trainer = trainer or self.trainer
+        sections = []
+        
+        tech_keys = trainer.detect_technologies(user_input)
+        if tech_keys:
+            details = {key: technology_details(trainer.technologies[key]) for key in tech_keys}
+            sections.append(f"=== RELEVANT TECHNOLOGIES ===\n{json.dumps(details, indent=2)}")
+        
+        # Narrow the catalog locally with the filters in the question, then rank by text
+        filters = trainer.query_filters(user_input)
+        results = trainer.search(user_input, k=5, filters=filters, relax=True)
+        projects = [project_details(trainer.projects[row])
+                    for row, score in results if score > 0 or filters]
+        if projects:
+            sections.append(f"=== RELEVANT PROJECTS ===\n{json.dumps(projects, indent=2)}")
+        
+        return "\n\n".join(sections)
+
+    def create_system_prompt(self, trainer=None):
+        """Create a comprehensive system prompt with all your data (cached per trainer)"""
+        trainer = trainer or self.trainer
+        cached = self._system_prompt
+        if cached and cached[0] is trainer:
+            return cached[1]
+        
+        prompt = render_system_prompt(trainer)
+        self._system_prompt = (trainer, prompt)
         return prompt
 
+    def build_prompt(self, user_input, history, is_first_message, summary=None, history_turns=None):
+        """Full prompt for Gemini within the token budget (report kept in last_prompt_report)"""
+        # Add context about conversation state
+        if is_first_message:
+            state_note = "[This is the FIRST message - you can greet the student]"
+        else:
+            state_note = "[This is a FOLLOW-UP message - DO NOT greet again, just answer directly]"
+        
+        prompt, self.last_prompt_report = self.prompt_builder.build(
+            self.create_system_prompt(),
+            user_input,
+            knowledge=self.build_relevant_context(user_input),
+            history=history,
+            state_note=state_note,
+            summary=summary,
+            history_turns=history_turns
+        )
+        return prompt
+
+    def local_engine(self):
+        """Retrieval-only answer engine over the current trainer"""
+        cached = self._local_engine
+        if cached and cached[0] is self.trainer:
+            return cached[1]
+        engine = LocalAnswerEngine(self.trainer)
+        self._local_engine = (self.trainer, engine)
+        return engine
+
+    def answer_locally(self, user_input):
+        """Templated answer from the local catalog (Gemini unavailable or over budget)"""
+        self.last_answer_local = True
+        return self.local_engine().answer(user_input)
+
+    def over_budget(self):
+        """True when the last prompt did not fit the token budget even after trimming"""
+        report = self.last_prompt_report
+        return report is not None and report['total'] > report['budget']
+
     def chat_with_gemini(self, user_input):
         """Have a natural conversation with Gemini using your data as context"""
         
         if not self.use_gemini:
-            return "⚠️ Gemini AI not available. Please check your API key."
+            return self.answer_locally(user_input)
         
         try:
             # Build the full conversation context
-            system_prompt = self.create_system_prompt()
-            
-            # Add conversation history
-            conversation = system_prompt + "\n\n=== CONVERSATION ===\n"
-            
-            # Add context about conversation state
-            if self.is_first_message:
-                conversation += "[This is the FIRST message - you can greet the student]\n"
-                self.is_first_message = False
-            else:
-                conversation += "[This is a FOLLOW-UP message - DO NOT greet again, just answer directly]\n"
-            
-            for msg in self.conversation_history[-6:]:  # Last 3 exchanges
-                conversation += f"{msg}\n"
-            
-            conversation += f"Student: {user_input}\nAssistant:"
+            conversation = self.build_prompt(user_input, self.conversation_history, self.is_first_message)
+            if self.over_budget():
+                return self.answer_locally(user_input)
             
-            # Get response from Gemini
-            response = self.model.generate_content(conversation)
+            # Get response from Gemini; outages and quota errors fall back to the catalog
+            try:
+                response = self.model.generate_content(conversation)
+            except Exception as e:
+                print(f"⚠️ Gemini error: {e}")
+                return self.answer_locally(user_input)
+            self.is_first_message = False
             
             # Store in history
             self.conversation_history.append(f"Student: {user_input}")
@@ -245,11 +342,16 @@ Remember: You're not just a database lookup tool - you're an intelligent assista
     def handle_question(self, user_input):
         """Main question handler - now fully AI-powered with caching!"""
         
+        self.last_prompt_report = None
+        self.last_answer_local = False
+        
         # Check cache first for performance
         cache_key = self._get_cache_key(user_input)
-        if cache_key in self.response_cache:
+        knowledge_version = self.trainer.knowledge_version()
+        cached = self.response_cache.get(cache_key)
+        if cached and cached[1] in (None, knowledge_version):
             self.cache_hits += 1
-            return self.response_cache[cache_key]
+            return cached[0]
         
         self.cache_misses += 1
         
@@ -257,9 +359,12 @@ Remember: You're not just a database lookup tool - you're an intelligent assista
             # Use Gemini for everything - it's smarter!
             response = self.chat_with_gemini(user_input)
         else:
-            # Fallback to basic mode
-            response = ("I need Gemini API to provide intelligent responses. "
-                       "Please set up your API key to enable AI-powered conversations.")
+            # Basic mode: answer from the local catalog
+            response = self.answer_locally(user_input)
+        
+        # Local answers are instant, and Gemini may be back for the next request
+        if self.last_answer_local:
+            return response
         
         # Cache the response (keep last 50 responses)
         if len(self.response_cache) >= 50:
@@ -267,7 +372,7 @@ Remember: You're not just a database lookup tool - you're an intelligent assista
             oldest_key = next(iter(self.response_cache))
             del self.response_cache[oldest_key]
         
-        self.response_cache[cache_key] = response
+        self.response_cache[cache_key] = (response, knowledge_version)
         return response
 
     def chat(self):
@@ -314,7 +419,10 @@ Remember: You're not just a database lookup tool - you're an intelligent assista
                     print(f"   • Hits: {self.cache_hits}")
                     print(f"   • Misses: {self.cache_misses}")
                     print(f"   • Hit Rate: {hit_rate:.1f}%")
-                    print(f"   • Cached Responses: {len(self.response_cache)}/50\n")
+                    print(f"   • Cached Responses: {len(self.response_cache)}/50")
+                    search_stats = self.trainer.cache_stats()['results']
+                    print(f"   • Search Cache: {search_stats['hits']} hits, "
+                          f"{search_stats['hit_rate'] * 100:.1f}% hit rate\n")
                     continue
                 
                 response = self.handle_question(user_input)
@@ -6,13 +6,26 @@ import sys
 import json
 import os
 import io
+import signal
+import threading
+import time
+from datetime import datetime
 
 # Global bot instances per user (stays alive)
 bot_instances = {}
 
+# Knowledge base shared by every bot instance. A reload builds the next one
+# in the background; it is swapped in between requests so that a request
+# never sees two different knowledge bases.
+shared_trainer = None
+pending_knowledge = None
+reload_lock = threading.Lock()
+reload_thread = None
+reload_status = {'state': 'idle', 'knowledge_version': None, 'error': None}
+
 def initialize_bot(user_id=None, force_reinit=False):
     """Initialize the chatbot once per user and keep it alive"""
-    global bot_instances
+    global bot_instances, shared_trainer
     
     if user_id and user_id in bot_instances and not force_reinit:
         return True
@@ -101,8 +114,13 @@ def initialize_bot(user_id=None, force_reinit=False):
         
         print(f"🔧 Bot instance created, use_gemini={bot.use_gemini}", file=sys.stderr)
         
-        # Load model
-        if not bot.load_model():
+        # Reuse the shared knowledge base, load it only for the first bot
+        if shared_trainer is not None:
+            bot.use_trainer(shared_trainer)
+        elif bot.load_model():
+            shared_trainer = bot.trainer
+            reload_status['knowledge_version'] = shared_trainer.knowledge_version()
+        else:
             sys.stdout = old_stdout
             print("❌ Failed to load model", file=sys.stderr)
             return False
@@ -118,10 +136,165 @@ def initialize_bot(user_id=None, force_reinit=False):
         print(f"Initialization error: {e}", file=sys.stderr)
         return False
 
+def _build_knowledge():
+    """Background worker: load or rebuild the knowledge base from the data files"""
+    global pending_knowledge
+    try:
+        from train_bot import ProjectChatbotTrainer
+        from chatbot import render_system_prompt
+        
+        # stdout carries the JSON protocol, so progress goes to stderr
+        trainer = ProjectChatbotTrainer(log_file=sys.stderr)
+        if not trainer.load_trained_model():
+            if not trainer.load_data():
+                raise Exception("Could not load data files")
+            trainer.prepare_project_vectors()
+            trainer.save_trained_model()
+        
+        # Render the system prompt here too so the swap itself is cheap; live
+        # bots are only touched in apply_pending_knowledge, between requests
+        system_prompt = render_system_prompt(trainer)
+        
+        with reload_lock:
+            pending_knowledge = (trainer, system_prompt)
+            reload_status.update(state='ready', error=None)
+        print(f"✅ Knowledge base rebuilt ({trainer.knowledge_version()})", file=sys.stderr)
+    
+    except Exception as e:
+        with reload_lock:
+            reload_status.update(state='failed', error=str(e))
+        print(f"❌ Knowledge reload failed: {e}", file=sys.stderr)
+
+def apply_pending_knowledge():
+    """Swap a finished reload into every live bot (called between requests)"""
+    global shared_trainer, pending_knowledge
+    with reload_lock:
+        knowledge, pending_knowledge = pending_knowledge, None
+    if knowledge is None:
+        return
+    
+    trainer, system_prompt = knowledge
+    shared_trainer = trainer
+    for bot in bot_instances.values():
+        bot.use_trainer(trainer, system_prompt)
+    reload_status.update(state='idle', knowledge_version=trainer.knowledge_version())
+
+def reload_knowledge(wait=False):
+    """Start a background knowledge reload unless one is already running"""
+    global reload_thread
+    with reload_lock:
+        if reload_thread is None or not reload_thread.is_alive():
+            reload_status.update(state='reloading', error=None)
+            reload_thread = threading.Thread(target=_build_knowledge, daemon=True)
+            reload_thread.start()
+        thread = reload_thread
+    
+    if wait:
+        thread.join()
+        apply_pending_knowledge()
+    
+    return {
+        'success': reload_status['state'] != 'failed',
+        'status': reload_status['state'],
+        'knowledge_version': reload_status['knowledge_version'],
+        'error': reload_status['error']
+    }
+
+def start_knowledge_watcher(interval):
+    """Poll the data files and trigger a reload when their content changes"""
+    from train_bot import DATA_FILES
+    from model_store import check_source
+    
+    def watch():
+        while True:
+            time.sleep(interval)
+            trainer = shared_trainer
+            if trainer is None or reload_status['state'] in ('reloading', 'ready'):
+                continue
+            try:
+                if any(check_source(path, trainer.sources.get(part)) == 'stale'
+                       for part, path in DATA_FILES.items()):
+                    print("🔄 Data files changed, reloading knowledge base", file=sys.stderr)
+                    reload_knowledge()
+            except Exception as e:
+                print(f"⚠️ Knowledge watcher error: {e}", file=sys.stderr)
+    
+    threading.Thread(target=watch, daemon=True).start()
+
+def handle_knowledge_request(request_data):
+    """Structured catalog lookups served from the shared trainer, without Gemini"""
+    if shared_trainer is None and not initialize_bot():
+        return {
+            'success': False,
+            'error': 'Failed to initialize chatbot'
+        }
+    
+    trainer = shared_trainer
+    action = request_data.get('action')
+    try:
+        k = max(1, min(int(request_data.get('k', 5)), 50))
+    except (TypeError, ValueError):
+        return {'success': False, 'error': 'k must be a number'}
+    
+    if action == 'recommend':
+        filters = request_data.get('filters') or {}
+        if not isinstance(filters, dict):
+            return {'success': False, 'error': 'filters must be an object'}
+        try:
+            projects = trainer.recommend(request_data.get('query', ''), filters, k)
+        except TypeError as e:
+            return {'success': False, 'error': f'Invalid filter: {e}'}
+        return {'success': True, 'projects': projects}
+    
+    elif action == 'similar_projects':
+        project_id = request_data.get('project_id')
+        # Form and query-string clients send ids as text ("2")
+        if isinstance(project_id, str) and project_id.strip().isdigit():
+            project_id = int(project_id)
+        projects = trainer.similar_projects(project_id, k)
+        if projects is None:
+            return {'success': False, 'error': 'Project not found'}
+        return {'success': True, 'projects': projects}
+    
+    elif action == 'explain_tech':
+        technology = trainer.explain_technology(request_data.get('name') or '', k)
+        if technology is None:
+            return {'success': False, 'error': 'Technology not found'}
+        return {'success': True, 'technology': technology}
+    
+    elif action == 'cache_stats':
+        return {
+            'success': True,
+            'knowledge_version': trainer.knowledge_version(),
+            'search_cache': trainer.cache_stats()
+        }
+
+def collect_metrics():
+    """Gemini routing health plus knowledge-base and search-cache state"""
+    bot = next(iter(bot_instances.values()), None)
+    return {
+        'success': True,
+        'gemini': bot.model.metrics() if bot is not None and bot.use_gemini else None,
+        'knowledge_version': reload_status['knowledge_version'],
+        'search_cache': shared_trainer.cache_stats() if shared_trainer is not None else None
+    }
+
 def handle_request(request_data):
     """Handle multi-chat requests with persistent bot per user"""
     global bot_instances
     
+    # Knowledge reloads finished in the background take effect here
+    apply_pending_knowledge()
+    
+    if request_data.get('action') == 'reload_knowledge':
+        return reload_knowledge(wait=request_data.get('wait', False))
+    
+    if request_data.get('action') == 'metrics':
+        return collect_metrics()
+    
+    if request_data.get('action') in ('recommend', 'similar_projects', 'explain_tech', 'cache_stats'):
+        return handle_knowledge_request(request_data)
+    
     user_id = request_data.get('user_id')
     
     if not user_id or user_id not in bot_instances:
@@ -162,7 +335,9 @@ def handle_request(request_data):
             return {
                 'success': True,
                 'response': response,
-                'session_id': current_session.session_id
+                'session_id': current_session.session_id,
+                'prompt_tokens': bot.last_prompt_report,
+                'local_answer': bot.last_answer_local
             }
         
         elif action == 'new_session':
@@ -177,11 +352,15 @@ def handle_request(request_data):
             }
         
         elif action == 'list_sessions':
-            sessions = bot.chat_manager.list_sessions()
+            from chat_manager_mongodb import list_cursor
+            limit = request_data.get('limit')
+            sessions = bot.chat_manager.list_sessions(limit=limit, before=request_data.get('cursor'))
             
             return {
                 'success': True,
-                'sessions': sessions
+                'sessions': sessions,
+                # Position of the last session when more may follow
+                'next_cursor': list_cursor(sessions[-1]) if limit and len(sessions) == limit else None
             }
         
         elif action == 'switch_session':
@@ -218,19 +397,43 @@ def handle_request(request_data):
         elif action == 'get_messages':
             session_id = request_data.get('session_id')
             
-            # Switch to the session temporarily to get messages
-            current_id = bot.chat_manager.current_session_id
-            bot.chat_manager.switch_session(session_id)
-            session = bot.chat_manager.get_current_session()
-            messages = session.messages if hasattr(session, 'messages') else []
+            # Newest page first; pass next_cursor back to load older messages
+            page = bot.chat_manager.get_messages(
+                session_id,
+                cursor=request_data.get('cursor'),
+                pages=request_data.get('pages', 1)
+            )
             
-            # Switch back
-            if current_id:
-                bot.chat_manager.switch_session(current_id)
+            return {
+                'success': True,
+                'messages': page['messages'],
+                'next_cursor': page['next_cursor']
+            }
+        
+        elif action == 'search_sessions':
+            query = (request_data.get('query') or '').strip()
+            if not query:
+                return {'success': False, 'error': 'query is required'}
+            limit = request_data.get('limit', 20)
+            offset = request_data.get('cursor') or 0
+            results = bot.chat_manager.search_sessions(query, limit=limit, offset=offset)
+            
+            return {
+                'success': True,
+                'sessions': results,
+                'next_cursor': offset + limit if len(results) == limit else None
+            }
+        
+        elif action == 'stats':
+            # Totals over every user are an admin view, off unless the server enables it
+            all_users = bool(request_data.get('all_users'))
+            if all_users and os.getenv('CHAT_STATS_ALL_USERS', '').lower() not in ('1', 'true', 'yes'):
+                return {'success': False, 'error': 'all_users stats are disabled'}
+            stats = bot.chat_manager.get_stats(all_users=all_users)
             
             return {
                 'success': True,
-                'messages': messages
+                'stats': stats
             }
         
         elif action == 'ping':
@@ -248,9 +451,19 @@ def handle_request(request_data):
             'error': str(e)
         }
 
+def json_default(value):
+    """MongoDB dates leave the API as ISO strings"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
 def main():
     """Main loop - keeps Python process alive"""
     try:
+        # The Node server stops this process with SIGTERM (pythonProcess.kill());
+        # exit normally so atexit handlers, such as the write-behind flush, still run
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        
         # Set UTF-8 encoding
         if sys.platform == 'win32':
             sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
@@ -263,6 +476,11 @@ def main():
             sys.stdout.flush()
             return
         
+        # Optional file watcher for hot knowledge reloads
+        watch_interval = float(os.getenv('KNOWLEDGE_WATCH_INTERVAL', '0') or 0)
+        if watch_interval > 0:
+            start_knowledge_watcher(watch_interval)
+        
         # Send ready signal
         print(json.dumps({'status': 'ready'}, ensure_ascii=False))
         sys.stdout.flush()
@@ -277,7 +495,7 @@ def main():
                 request = json.loads(line.strip())
                 response = handle_request(request)
                 
-                print(json.dumps(response, ensure_ascii=False))
+                print(json.dumps(response, ensure_ascii=False, default=json_default))
                 sys.stdout.flush()
                 
             except json.JSONDecodeError as e:
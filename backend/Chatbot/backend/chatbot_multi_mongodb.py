@@ -4,14 +4,20 @@ Supports multiple conversation threads with MongoDB storage
 """
 import os
 import sys
+import threading
 from chatbot import GeminiProjectChatbotV2
 from chat_manager_mongodb import ChatManagerMongoDB
+from prompt_builder import SUMMARY_MAX_TOKENS, summary_prompt, trim_to_tokens
+
+# Fold older turns into the session summary every N new turns (0 disables)
+DEFAULT_SUMMARY_EVERY = 6
 
 class MultiChatBotMongoDB(GeminiProjectChatbotV2):
     """Extended chatbot with MongoDB-based multi-chat support"""
     
     def __init__(self, api_key=None, mongodb_uri='mongodb://localhost:27017/', db_name='fyp_buddy', user_id=None):
         super().__init__(api_key)
+        self.summary_every = int(os.getenv('SESSION_SUMMARY_EVERY', DEFAULT_SUMMARY_EVERY))
         
         try:
             self.chat_manager = ChatManagerMongoDB(mongodb_uri, db_name, user_id)
@@ -37,7 +43,7 @@ class MultiChatBotMongoDB(GeminiProjectChatbotV2):
         """Override conversation history to use current session"""
         session = self.chat_manager.get_current_session()
         if session:
-            self.conversation_history = session.get_conversation_history()
+            self.conversation_history = session.recent_history()
             self.is_first_message = session.is_first_message
         else:
             # No session exists yet - use empty history
@@ -53,30 +59,35 @@ class MultiChatBotMongoDB(GeminiProjectChatbotV2):
             return "Please create a chat session first by sending a message."
         
         if not self.use_gemini:
-            return "Gemini AI not available. Please check your API key."
+            return self.answer_locally(user_input)
         
         try:
-            system_prompt = self.create_system_prompt()
-            conversation = system_prompt + "\n\n=== CONVERSATION ===\n"
-            
-            if session.is_first_message:
-                conversation += "[This is the FIRST message - you can greet the student]\n"
-                session.is_first_message = False
-            else:
-                conversation += "[This is a FOLLOW-UP message - DO NOT greet again, just answer directly]\n"
-            
-            # Use last 6 messages from session
-            for msg in session.get_conversation_history()[-6:]:
-                conversation += f"{msg}\n"
+            # Summary of older turns plus recent messages, within the prompt token budget.
+            # Turns that left the history window are still sent until a summary covers them
+            history = self.unsummarized_history(session)
+            conversation = self.build_prompt(
+                user_input,
+                history,
+                session.is_first_message,
+                summary=session.summary,
+                history_turns=len(history) if self.summary_every else None
+            )
+            if self.over_budget():
+                return self.answer_locally(user_input)
             
-            conversation += f"Student: {user_input}\nAssistant:"
-            
-            response = self.model.generate_content(conversation)
+            # Outages and quota errors fall back to the local catalog
+            try:
+                response = self.model.generate_content(conversation)
+            except Exception as e:
+                print(f"Gemini error: {e}", file=sys.stderr)
+                return self.answer_locally(user_input)
+            session.is_first_message = False
             
             # Save to session
             session.add_message('user', user_input)
             session.add_message('assistant', response.text)
             self.chat_manager.save_session(session.session_id)
+            self.schedule_summary(session)
             
             return response.text.strip()
             
@@ -84,6 +95,67 @@ class MultiChatBotMongoDB(GeminiProjectChatbotV2):
             print(f"Gemini error: {e}", file=sys.stderr)
             return f"Sorry, I encountered an error. Please try rephrasing your question."
     
+    def answer_locally(self, user_input):
+        """Local catalog answer, stored in the session like any other turn"""
+        response = super().answer_locally(user_input)
+        session = self.chat_manager.get_current_session()
+        if session:
+            session.is_first_message = False
+            session.add_message('user', user_input)
+            session.add_message('assistant', response)
+            self.chat_manager.save_session(session.session_id)
+        return response
+    
+    @staticmethod
+    def unsummarized_history(session):
+        """Formatted turns not covered by the summary yet, oldest first"""
+        unsummarized = session.message_count - session.summarized_count
+        if unsummarized <= session.history_buffer.maxlen:
+            return session.recent_history(unsummarized)
+        # More than the ring buffer holds (summaries failing): read the whole range
+        return session.get_conversation_history(session.summarized_count, session.message_count)
+    
+    def schedule_summary(self, session):
+        """Summarize older turns in the background once N of them fall out of the prompt history"""
+        if not self.summary_every or not self.use_gemini or session.summary_pending:
+            return
+        # After a failure (quota, outage) wait another summary_every turns before retrying
+        if (session.summary_failed_at is not None
+                and session.message_count - session.summary_failed_at < self.summary_every):
+            return
+        # The most recent turns are always sent verbatim
+        upto = session.message_count - self.prompt_builder.history_turns
+        if upto - session.summarized_count < self.summary_every:
+            return
+        
+        session.summary_pending = True
+        threading.Thread(target=self._update_summary, args=(session, upto), daemon=True).start()
+    
+    def _update_summary(self, session, upto):
+        """
+        Background worker: fold messages[summarized_count:upto] into the summary
+        
+        Only the in-memory session is updated; the next save_session stores
+        it, so the worker never races the request thread on storage.
+        """
+        try:
+            start = session.summarized_count
+            # Reads only these turns' pages; the session stays unloaded
+            turns = session.get_conversation_history(start, upto)
+            response = self.model.generate_content(
+                summary_prompt(session.summary, turns, self.prompt_builder.budget))
+            
+            # Skip the result if the session was cleared in the meantime
+            if session.message_count >= upto and session.summarized_count == start:
+                session.summary = trim_to_tokens(response.text.strip(), SUMMARY_MAX_TOKENS)
+                session.summarized_count = upto
+            session.summary_failed_at = None
+        except Exception as e:
+            session.summary_failed_at = session.message_count
+            print(f"⚠️ Summary update failed: {e}", file=sys.stderr)
+        finally:
+            session.summary_pending = False
+    
     def handle_chat_command(self, command):
         """Handle multi-chat commands"""
         parts = command.split(maxsplit=1)
@@ -185,9 +257,10 @@ class MultiChatBotMongoDB(GeminiProjectChatbotV2):
             if not self.mongodb_enabled:
                 return "❌ Stats require MongoDB"
             
-            stats = self.chat_manager.get_stats()
+            all_users = len(parts) > 1 and parts[1].strip().lower() == 'all'
+            stats = self.chat_manager.get_stats(all_users=all_users)
             return f"""
-📊 Database Statistics:
+📊 Database Statistics ({'all users' if all_users else 'your chats'}):
    • Total Chats: {stats['total_sessions']}
    • Total Messages: {stats['total_messages']}
    • Chats in Memory: {stats['sessions_in_memory']}
@@ -208,7 +281,7 @@ class MultiChatBotMongoDB(GeminiProjectChatbotV2):
             if self.mongodb_enabled:
                 help_text += """
   /search <query>    - Search chats by title/content
-  /stats             - Show database statistics
+  /stats [all]       - Show database statistics (all: every user)
 """
             help_text += """
 💡 Tips:
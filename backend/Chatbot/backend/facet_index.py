@@ -0,0 +1,253 @@
+"""
+Faceted filter indexes over the project catalog for FYP Buddy AI
+Every facet value maps to a bitmap (a Python int, bit i = project row i),
+so structured questions are answered with a few AND/OR operations.
+"""
+import re
+from collections import defaultdict
+
+from tech_index import normalize
+
+DEPARTMENT_NAMES = {
+    'computer science': 'CS',
+    'information technology': 'IT',
+    'software engineering': 'SE',
+    'machine learning department': 'ML',
+    'mechanical engineering': 'ME'
+}
+
+DIFFICULTY_WORDS = {
+    'easy': 'Easy',
+    'simple': 'Easy',
+    'medium': 'Medium',
+    'intermediate': 'Medium',
+    'moderate': 'Medium',
+    'hard': 'High',
+    'high': 'High',
+    'difficult': 'High',
+    'advanced': 'High',
+    'challenging': 'High'
+}
+
+# Hardware text -> coarse level used by "low hardware" style questions
+HARDWARE_LEVELS = [
+    ('embedded', ('microcontroller', 'sensor', 'raspberry', 'arduino', 'esp32', 'esp8266', 'drone', 'rfid')),
+    ('gpu', ('gpu',)),
+    ('mobile', ('smartphone', 'mobile', 'tablet'))
+]
+
+# Filters dropped one by one, least important first, when nothing matches
+RELAX_ORDER = ['hardware', 'min_duration', 'max_duration', 'department', 'difficulty',
+               'allowed_at_numl', 'beginner_friendly', 'technologies', 'related_topics']
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(month|week|year)', re.I)
+_MAX_DURATION_RE = re.compile(
+    r'(?:under|less than|within|at most|max(?:imum)?|no more than|up to|in|<=?)\s*(\d+)\s*months?'
+    r'|(\d+)\s*months?\s*or\s*(?:less|fewer)', re.I)
+_MIN_DURATION_RE = re.compile(
+    r'(?:over|more than|at least|min(?:imum)?|longer than|>=?)\s*(\d+)\s*months?', re.I)
+
+
+def parse_duration(text):
+    """'6 months' -> 6, '3-4 months' -> 4, '1 year' -> 12; None when unparseable"""
+    match = _DURATION_RE.search(text or '')
+    if not match:
+        return None
+    value = float(match.group(2) or match.group(1))
+    unit = match.group(3).lower()
+    if unit == 'week':
+        value /= 4
+    elif unit == 'year':
+        value *= 12
+    return int(round(value))
+
+
+def _text_values(name, value):
+    """A text filter value as a list (a single string is one value, not its characters)"""
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, (list, tuple, set)) or not all(isinstance(v, str) for v in values):
+        raise TypeError(f"{name} must be a string or a list of strings")
+    return list(values)
+
+
+def _flag(name, value):
+    if not isinstance(value, bool):
+        raise TypeError(f"{name} must be true or false")
+    return value
+
+
+def _months(name, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"{name} must be a number of months")
+    return value
+
+
+def hardware_level(text):
+    text = (text or '').lower()
+    for level, keywords in HARDWARE_LEVELS:
+        if any(keyword in text for keyword in keywords):
+            return level
+    return 'standard'
+
+
+class FacetIndex:
+    """Bitmap indexes over department, difficulty, flags, technologies, topics and duration"""
+
+    def __init__(self, projects, tech_index=None):
+        """
+        Args:
+            projects: Project records in vector-row order (ProjectChatbotTrainer.projects)
+            tech_index: Optional TechnologyIndex used to canonicalize technology names
+        """
+        self.size = len(projects)
+        self.all_rows = (1 << self.size) - 1
+        self.tech_index = tech_index
+        self.facets = defaultdict(lambda: defaultdict(int))
+        self.durations = defaultdict(int)
+
+        for row, project in enumerate(projects):
+            bit = 1 << row
+            self.facets['department'][str(project.get('department')).upper()] |= bit
+            self.facets['difficulty'][str(project.get('difficulty')).lower()] |= bit
+            self.facets['beginner_friendly'][bool(project.get('beginner_friendly'))] |= bit
+            self.facets['allowed_at_numl'][bool(project.get('allowed_at_numl'))] |= bit
+            self.facets['hardware'][hardware_level(project.get('hardware'))] |= bit
+            for tech in project.get('technologies', []):
+                self.facets['technologies'][self.technology_key(tech)] |= bit
+            for topic in project.get('related_topics', []):
+                self.facets['related_topics'][topic.lower()] |= bit
+            months = parse_duration(project.get('duration'))
+            if months is not None:
+                self.durations[months] |= bit
+
+        # Longest topics first so "machine learning" wins over "learning"
+        topics = sorted(self.facets['related_topics'], key=len, reverse=True)
+        self._topic_re = re.compile(
+            r'\b(' + '|'.join(re.escape(topic) for topic in topics) + r')\b'
+        ) if topics else None
+
+    def technology_key(self, name):
+        """Canonical facet key of a technology name ('React.js' -> 'react')"""
+        if self.tech_index is not None:
+            key = self.tech_index.lookup(name)
+            if key:
+                return key
+        return normalize(name)
+
+    def _any_of(self, facet, values):
+        mask = 0
+        for value in values:
+            mask |= self.facets[facet].get(value, 0)
+        return mask
+
+    def filter(self, department=None, difficulty=None, beginner_friendly=None,
+               allowed_at_numl=None, hardware=None, technologies=None,
+               related_topics=None, min_duration=None, max_duration=None):
+        """
+        Bitmap of the projects matching every given filter
+
+        Single-valued facets accept a value or a list (any of); technologies
+        and related_topics accept a value or a list that must all be present.
+        Returns None when no filter is set; raises TypeError for values of
+        the wrong type.
+        """
+        mask = self.all_rows
+        active = False
+
+        if department:
+            mask &= self._any_of('department', [d.upper() for d in _text_values('department', department)])
+            active = True
+        if difficulty:
+            mask &= self._any_of('difficulty', [d.lower() for d in _text_values('difficulty', difficulty)])
+            active = True
+        if beginner_friendly is not None:
+            mask &= self.facets['beginner_friendly'].get(_flag('beginner_friendly', beginner_friendly), 0)
+            active = True
+        if allowed_at_numl is not None:
+            mask &= self.facets['allowed_at_numl'].get(_flag('allowed_at_numl', allowed_at_numl), 0)
+            active = True
+        if hardware:
+            mask &= self._any_of('hardware', _text_values('hardware', hardware))
+            active = True
+        for tech in _text_values('technologies', technologies or []):
+            mask &= self.facets['technologies'].get(self.technology_key(tech), 0)
+            active = True
+        for topic in _text_values('related_topics', related_topics or []):
+            mask &= self.facets['related_topics'].get(topic.lower(), 0)
+            active = True
+        if min_duration is not None or max_duration is not None:
+            low = _months('min_duration', min_duration) if min_duration is not None else 0
+            high = _months('max_duration', max_duration) if max_duration is not None else float('inf')
+            duration_mask = 0
+            for months, bits in self.durations.items():
+                if low <= months <= high:
+                    duration_mask |= bits
+            mask &= duration_mask
+            active = True
+
+        return mask if active else None
+
+    @staticmethod
+    def rows(mask):
+        """Row numbers set in a bitmap, ascending"""
+        rows = []
+        row = 0
+        while mask:
+            if mask & 1:
+                rows.append(row)
+            mask >>= 1
+            row += 1
+        return rows
+
+    def parse_query(self, text, technologies=None):
+        """
+        Extract structured filters from a free-text question
+
+        Example: "beginner friendly IoT projects under 4 months with low hardware"
+        -> {'beginner_friendly': True, 'related_topics': ['iot'],
+            'max_duration': 4, 'hardware': 'standard'}
+
+        Args:
+            text: The question
+            technologies: Technology keys already detected in the text
+        """
+        lower = text.lower()
+        filters = {}
+
+        if re.search(r'\bbeginners?\b|\bnewbies?\b|\bfirst project\b', lower):
+            filters['beginner_friendly'] = True
+
+        difficulties = {label for word, label in DIFFICULTY_WORDS.items()
+                        if re.search(rf'\b{word}\b', lower)}
+        if difficulties:
+            filters['difficulty'] = sorted(difficulties)
+
+        departments = set(re.findall(r'\b(CS|IT|SE|ME)\b', text))
+        departments.update(code for name, code in DEPARTMENT_NAMES.items() if name in lower)
+        if departments:
+            filters['department'] = sorted(departments)
+
+        if re.search(r'\b(low|no|without|minimal|cheap|basic)\b[\w\s-]{0,12}\bhardware\b|\bstandard pc\b|\bonly (a )?(pc|laptop)\b', lower):
+            filters['hardware'] = 'standard'
+
+        match = _MAX_DURATION_RE.search(lower)
+        if match:
+            filters['max_duration'] = int(match.group(1) or match.group(2))
+        match = _MIN_DURATION_RE.search(lower)
+        if match:
+            filters['min_duration'] = int(match.group(1))
+
+        if self._topic_re:
+            topics = []
+            for topic in self._topic_re.findall(lower):
+                if topic not in topics:
+                    topics.append(topic)
+            if topics:
+                filters['related_topics'] = topics
+
+        # Only technologies some project actually uses narrow the catalog
+        techs = [key for key in technologies or [] if key in self.facets['technologies']]
+        if techs:
+            filters['technologies'] = techs
+
+        return filters
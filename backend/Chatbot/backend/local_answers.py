@@ -0,0 +1,159 @@
+"""
+Retrieval-only answer engine for FYP Buddy AI
+Writes templated answers from the local catalog - intents, project search,
+facet filters and technology descriptions - so students still get useful
+replies while Gemini is unavailable, rate-limited or over budget.
+"""
+import random
+import re
+
+# Shown under every local answer so students know why it reads differently
+LOCAL_NOTE = "_⚡ Quick answer from the FYP Buddy catalog while the AI assistant is unavailable._"
+
+# Intents answered straight from intents.json responses
+SMALL_TALK_INTENTS = ('greeting', 'goodbye', 'thanks', 'chitchat')
+
+_ISLAMIC_GREETING_RE = re.compile(r'\b(assalam|asalam|salaam|salam|aoa)\b|السلام|سلام', re.I)
+_TECH_QUESTION_RE = re.compile(r'\b(what is|what are|what\'s|explain|meaning|define|tell me about|how does)\b', re.I)
+_PROJECT_WORDS_RE = re.compile(r'\b(projects?|ideas?|fyp|suggest|recommend|build|make)\b', re.I)
+_SIMILAR_RE = re.compile(r'\b(similar|like|alternatives?)\b', re.I)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _words(text):
+    return ' '.join(_WORD_RE.findall(text.lower()))
+
+
+class LocalAnswerEngine:
+    """Answers questions from a ProjectChatbotTrainer without calling the LLM"""
+
+    def __init__(self, trainer):
+        self.trainer = trainer
+
+        # Placeholder-free intent patterns, normalized: "good morning" -> greeting
+        self.intent_patterns = {}
+        self.intent_responses = {}
+        for intent in trainer.intents:
+            if intent['tag'] not in SMALL_TALK_INTENTS:
+                continue
+            self.intent_responses[intent['tag']] = intent.get('responses', [])
+            for pattern in intent.get('patterns', []):
+                if '{' not in pattern:
+                    self.intent_patterns.setdefault(_words(pattern), intent['tag'])
+
+        # Project names mentioned verbatim, longest first
+        names = {}
+        for row, project in enumerate(trainer.projects):
+            names.setdefault(project['name'].lower(), row)
+        self.project_rows = names
+        self._name_re = re.compile(
+            r'\b(' + '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + r')\b'
+        ) if names else None
+
+    def answer(self, text):
+        """Templated answer to a student's message"""
+        text = text.strip()
+        normalized = _words(text)
+
+        if _ISLAMIC_GREETING_RE.search(text) and len(normalized.split()) <= 4:
+            return "Wa Alaikum Assalam! 🌙 How can I help you with your FYP today?"
+
+        tag = self.intent_patterns.get(normalized)
+        if tag and self.intent_responses.get(tag):
+            return random.choice(self.intent_responses[tag])
+
+        row = self._mentioned_project(text)
+        if row is not None:
+            if _SIMILAR_RE.search(text):
+                return self._similar_answer(row)
+            return self._with_note(self._project_answer(row))
+
+        techs = self.trainer.detect_technologies(text)
+        if techs and (_TECH_QUESTION_RE.search(text) or not _PROJECT_WORDS_RE.search(text)):
+            return self._with_note(self._technology_answer(techs))
+
+        projects = self._project_list(text)
+        if projects:
+            return self._with_note(projects)
+
+        return self._with_note(
+            "I can help you find FYP ideas and explain technologies. Try asking:\n"
+            "• \"Suggest beginner friendly IoT projects\"\n"
+            "• \"Machine learning projects under 6 months\"\n"
+            "• \"What is TensorFlow?\"\n"
+            "• \"Projects similar to Smart Attendance System\""
+        )
+
+    def _with_note(self, text):
+        return f"{text}\n\n{LOCAL_NOTE}"
+
+    def _mentioned_project(self, text):
+        if self._name_re is None:
+            return None
+        match = self._name_re.search(text.lower())
+        return self.project_rows[match.group(1)] if match else None
+
+    @staticmethod
+    def _project_line(project):
+        """One-line project summary (department is never shown)"""
+        details = [f"Technologies: {', '.join(project.get('technologies', []))}"]
+        if project.get('difficulty'):
+            details.append(f"Difficulty: {project['difficulty']}")
+        if project.get('duration'):
+            details.append(f"Duration: {project['duration']}")
+        return f"**{project['name']}** - {project['description']} ({', '.join(details)})"
+
+    def _project_answer(self, row):
+        p = self.trainer.projects[row]
+        lines = [f"**{p['name']}**", p['description'], ""]
+        lines.append(f"• Technologies: {', '.join(p.get('technologies', []))}")
+        for label, field in (('Difficulty', 'difficulty'), ('Duration', 'duration'), ('Hardware', 'hardware')):
+            if p.get(field):
+                lines.append(f"• {label}: {p[field]}")
+        if p.get('beginner_friendly') is not None:
+            lines.append(f"• Beginner friendly: {'Yes' if p['beginner_friendly'] else 'No'}")
+        if p.get('allowed_at_numl') is not None:
+            lines.append(f"• Accepted at NUML: {'Yes' if p['allowed_at_numl'] else 'No'}")
+        if p.get('future_scope'):
+            lines.append(f"• Future scope: {p['future_scope']}")
+        return "\n".join(lines)
+
+    def _similar_answer(self, row):
+        project_id = self.trainer.projects[row].get('id')
+        similar = self.trainer.similar_projects(project_id, k=3) or []
+        if not similar:
+            return self._with_note(self._project_answer(row))
+        lines = [f"Projects similar to **{self.trainer.projects[row]['name']}**:", ""]
+        lines += [f"{i}. {self._project_line(p)}" for i, p in enumerate(similar, 1)]
+        return self._with_note("\n".join(lines))
+
+    def _technology_answer(self, tech_keys):
+        sections = []
+        for key in tech_keys[:2]:
+            tech = self.trainer.explain_technology(key, k=3)
+            if tech is None:
+                continue
+            lines = [f"**{tech['name']}**" + (f" ({tech['category']})" if tech.get('category') else "")]
+            lines.append(tech.get('long_description') or tech.get('short_description') or "")
+            if tech.get('examples'):
+                lines.append("Examples: " + "; ".join(tech['examples']))
+            if tech.get('difficulty'):
+                lines.append(f"Difficulty to learn: {tech['difficulty']}")
+            if tech['example_projects']:
+                lines.append("Projects that use it: " + ", ".join(p['name'] for p in tech['example_projects']))
+            if tech.get('more_info_link'):
+                lines.append(f"Learn more: {tech['more_info_link']}")
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
+
+    def _project_list(self, text):
+        filters = self.trainer.query_filters(text)
+        results = self.trainer.search(text, k=5, filters=filters, relax=True)
+        results = [(row, score) for row, score in results if score > 0 or filters]
+        if not results:
+            return None
+        lines = ["Here are some project ideas that match your question:", ""]
+        lines += [f"{i}. {self._project_line(self.trainer.projects[row])}"
+                  for i, (row, _) in enumerate(results[:5], 1)]
+        lines += ["", "Ask me about any of them for details or similar projects."]
+        return "\n".join(lines)
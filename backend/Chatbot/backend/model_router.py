@@ -0,0 +1,216 @@
+"""
+Runtime Gemini model routing for FYP Buddy AI
+Tracks latency and error rate per model, opens a circuit breaker on a
+failing model so requests fail over immediately instead of waiting for
+another timeout, and falls back to the next configured model.
+"""
+import inspect
+import os
+import sys
+import threading
+import time
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.3
+# Consecutive failures that open a model's breaker
+DEFAULT_FAILURE_THRESHOLD = 3
+# Seconds a breaker stays open before one trial request is let through
+DEFAULT_COOLDOWN = 30
+# Models slower than this (EWMA, seconds) are tried after faster ones
+DEFAULT_SLOW_SECONDS = 8
+# Per-request timeout passed to the API (seconds)
+DEFAULT_TIMEOUT = 30
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# Errors that mean "stop sending for a while" rather than a one-off failure
+_RATE_LIMIT_MARKERS = ('429', 'quota', 'resource exhausted', 'resourceexhausted', 'rate limit')
+
+
+def _accepts_request_options(model):
+    """Whether model.generate_content takes request_options (google-generativeai 0.4+)"""
+    try:
+        params = inspect.signature(model.generate_content).parameters
+    except (TypeError, ValueError):
+        return False
+    return 'request_options' in params or any(
+        param.kind == param.VAR_KEYWORD for param in params.values())
+
+
+class ModelUnavailableError(Exception):
+    """Raised when every model's breaker is open or every model failed"""
+
+
+class ModelStats:
+    """Health of one model: moving averages plus breaker state"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.last_error = None
+
+    def record(self, latency, error=None):
+        self.calls += 1
+        if latency is not None:
+            self.latency = latency if self.latency is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency)
+        self.error_rate = EWMA_ALPHA * (1.0 if error else 0.0) + (1 - EWMA_ALPHA) * self.error_rate
+        if error:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200]
+        else:
+            self.consecutive_failures = 0
+
+    def to_dict(self, now):
+        return {
+            'model': self.name,
+            'state': self.state,
+            'latency_ms': round(self.latency * 1000) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'calls': self.calls,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'open_for_seconds': round(now - self.opened_at, 1) if self.opened_at else None,
+            'last_error': self.last_error
+        }
+
+
+class ModelRouter:
+    """
+    Drop-in replacement for a single GenerativeModel: generate_content()
+    picks the healthiest model, records the outcome and fails over.
+    """
+
+    # Routers are shared per model list so every bot in the process sees
+    # the same breaker state
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, models, failure_threshold=None, cooldown=None, slow_seconds=None, timeout=None):
+        """
+        Args:
+            models: List of (name, model) pairs in order of preference
+        """
+        self.models = list(models)
+        self.stats = {name: ModelStats(name) for name, _ in self.models}
+        self.failure_threshold = failure_threshold or int(
+            os.getenv('GEMINI_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD))
+        self.cooldown = cooldown or float(os.getenv('GEMINI_BREAKER_COOLDOWN', DEFAULT_COOLDOWN))
+        self.slow_seconds = slow_seconds or float(os.getenv('GEMINI_SLOW_SECONDS', DEFAULT_SLOW_SECONDS))
+        self.timeout = timeout or float(os.getenv('GEMINI_TIMEOUT', DEFAULT_TIMEOUT))
+        # Checked once per model; errors raised by a call are never mistaken for it
+        self._supports_timeout = {name: _accepts_request_options(model) for name, model in self.models}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, model_names, factory):
+        """
+        Router for these model names, created once per process
+
+        Args:
+            model_names: Names in order of preference
+            factory: Callable name -> model (genai.GenerativeModel); names
+                     it rejects are skipped
+        """
+        key = tuple(model_names)
+        with cls._shared_lock:
+            router = cls._shared.get(key)
+            if router is None:
+                models = []
+                for name in model_names:
+                    try:
+                        models.append((name, factory(name)))
+                    except Exception as e:
+                        print(f"⚠️ Model {name} unavailable: {e}", file=sys.stderr)
+                router = cls._shared[key] = cls(models)
+            return router
+
+    def __len__(self):
+        return len(self.models)
+
+    @property
+    def model_name(self):
+        """Model the next request goes to first"""
+        order = self._candidates(time.time())
+        return order[0][0] if order else None
+
+    def _candidates(self, now):
+        """Models to try in order, fast ones first; breakers still cooling down are skipped"""
+        with self._lock:
+            candidates = []
+            for rank, (name, model) in enumerate(self.models):
+                stats = self.stats[name]
+                if stats.state == HALF_OPEN or (
+                        stats.state == OPEN and now - stats.opened_at < self.cooldown):
+                    continue
+                slow = stats.latency is not None and stats.latency > self.slow_seconds
+                candidates.append((slow, rank, name, model))
+            candidates.sort(key=lambda item: (item[0], item[1]))
+            return [(name, model) for _, _, name, model in candidates]
+
+    def _admit(self, name):
+        """Claim a call slot; an open breaker past its cooldown admits one trial request"""
+        with self._lock:
+            stats = self.stats[name]
+            if stats.state == CLOSED:
+                return True
+            if stats.state == OPEN and time.time() - stats.opened_at >= self.cooldown:
+                stats.state = HALF_OPEN
+                return True
+            return False
+
+    def _record(self, name, latency, error=None):
+        with self._lock:
+            stats = self.stats[name]
+            stats.record(latency, error)
+            rate_limited = error is not None and any(
+                marker in str(error).lower() for marker in _RATE_LIMIT_MARKERS)
+            if error is None:
+                stats.state, stats.opened_at = CLOSED, None
+            elif (stats.state == HALF_OPEN or rate_limited
+                  or stats.consecutive_failures >= self.failure_threshold):
+                stats.state, stats.opened_at = OPEN, time.time()
+
+    def _call(self, name, model, prompt):
+        if self._supports_timeout[name]:
+            return model.generate_content(prompt, request_options={'timeout': self.timeout})
+        # google-generativeai before 0.4 has no request_options
+        return model.generate_content(prompt)
+
+    def generate_content(self, prompt):
+        """Generate with the best available model, failing over on errors"""
+        candidates = self._candidates(time.time())
+        if not candidates:
+            raise ModelUnavailableError("All Gemini models are temporarily unavailable")
+
+        last_error = None
+        for name, model in candidates:
+            if not self._admit(name):
+                continue
+            start = time.time()
+            try:
+                response = self._call(name, model, prompt)
+            except Exception as e:
+                self._record(name, time.time() - start, e)
+                last_error = e
+                continue
+            self._record(name, time.time() - start)
+            return response
+
+        if last_error is None:
+            raise ModelUnavailableError("All Gemini models are temporarily unavailable")
+        raise ModelUnavailableError(f"All Gemini models failed: {last_error}")
+
+    def metrics(self):
+        """Breaker state, latency and error rate of every model"""
+        now = time.time()
+        with self._lock:
+            models = [self.stats[name].to_dict(now) for name, _ in self.models]
+        return {'active_model': self.model_name, 'models': models}
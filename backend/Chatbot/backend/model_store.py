@@ -0,0 +1,244 @@
+"""
+Versioned on-disk model format for FYP Buddy AI
+Numeric arrays are stored as .npy files and memory-mapped on load so that
+several worker processes share the same pages through the OS page cache.
+
+Every write goes to new files named after a generation and listed in the
+header; replacing the header is the single atomic switch, so a reader sees
+either the whole old model or the whole new one, never a mix.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Bump whenever the layout below changes; older models are rebuilt
+MODEL_FORMAT_VERSION = 3
+DEFAULT_MODEL_DIR = 'chatbot_model'
+HEADER_FILE = 'header.json'
+# Files of older generations are removed once unreferenced for this long, so
+# readers that just read the previous header and writers still busy are safe
+STALE_FILE_SECONDS = 600
+
+
+class ModelFormatError(Exception):
+    """Raised when a model directory is missing, incomplete or outdated"""
+
+
+def _replace_file(path, write):
+    """Write a file next to its final path and atomically move it in place"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    write(tmp_path)
+    # os.replace keeps the old inode alive for processes that still map it
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    _replace_file(path, write)
+
+
+def _write_array(path, array):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+    _replace_file(path, write)
+
+
+def _new_generation():
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}"
+
+
+def _referenced_files(header):
+    if not header:
+        return set()
+    return ({info['file'] for info in header.get('arrays', {}).values()}
+            | set(header.get('documents', {}).values()))
+
+
+def _remove_stale_files(model_dir, keep):
+    """Delete model files that no header references any more (best effort)"""
+    cutoff = time.time() - STALE_FILE_SECONDS
+    for filename in os.listdir(model_dir):
+        model_file = filename.endswith(('.npy', '.json')) or '.tmp-' in filename
+        if filename == HEADER_FILE or filename in keep or not model_file:
+            continue
+        path = os.path.join(model_dir, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            # Still mapped (Windows) or removed by another process
+            pass
+
+
+def write_model(model_dir, arrays, documents, metadata=None):
+    """
+    Write a model directory
+
+    Args:
+        model_dir: Target directory (created if missing)
+        arrays: Mapping of name -> NumPy array, stored as <name>.npy
+        documents: Mapping of name -> JSON-serialisable object, stored as <name>.json
+        metadata: Extra fields for the JSON header
+    """
+    os.makedirs(model_dir, exist_ok=True)
+
+    header = {
+        'format_version': MODEL_FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'arrays': {},
+        'documents': {}
+    }
+    return _write_entries(model_dir, header, arrays, documents, metadata)
+
+
+def update_model(model_dir, header, arrays=None, documents=None, metadata=None):
+    """
+    Rewrite only the given arrays and documents of an existing model
+
+    Entries that are not passed keep their current files.
+    """
+    header = json.loads(json.dumps(header))
+    header['updated_at'] = datetime.now().isoformat()
+    return _write_entries(model_dir, header, arrays or {}, documents or {}, metadata)
+
+
+def _write_entries(model_dir, header, arrays, documents, metadata):
+    try:
+        previous = read_header(model_dir)
+    except ModelFormatError:
+        previous = None
+
+    generation = _new_generation()
+    header.update(metadata or {})
+    header['generation'] = generation
+
+    # New files only; the ones the current header lists are left untouched
+    for name, array in arrays.items():
+        filename = f"{name}-{generation}.npy"
+        _write_array(os.path.join(model_dir, filename), array)
+        header['arrays'][name] = {
+            'file': filename,
+            'dtype': str(array.dtype),
+            'shape': list(array.shape)
+        }
+
+    for name, data in documents.items():
+        filename = f"{name}-{generation}.json"
+        _write_json(os.path.join(model_dir, filename), data)
+        header['documents'][name] = filename
+
+    # The header goes last and switches readers to the new generation at once
+    _write_json(os.path.join(model_dir, HEADER_FILE), header)
+    _remove_stale_files(model_dir, _referenced_files(header) | _referenced_files(previous))
+    return header
+
+
+def fingerprint(path, raw):
+    """Content hash plus the stat fields used for the cheap staleness check"""
+    st = os.stat(path)
+    return {
+        'path': path,
+        'sha256': hashlib.sha256(raw).hexdigest(),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns
+    }
+
+
+def check_source(path, recorded):
+    """
+    Compare a data file against the fingerprint recorded in a model header
+
+    Returns:
+        'fresh' if unchanged, 'touched' if only the timestamp changed,
+        'stale' if the content differs and 'missing' if the file is gone
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+
+    if not recorded:
+        return 'stale'
+
+    # Cheap path: same size and timestamp means the content was not rewritten
+    if st.st_size == recorded.get('size') and st.st_mtime_ns == recorded.get('mtime_ns'):
+        return 'fresh'
+
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return 'touched' if digest == recorded.get('sha256') else 'stale'
+
+
+def read_header(model_dir):
+    """Read and validate the JSON header of a model directory"""
+    path = os.path.join(model_dir, HEADER_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        raise ModelFormatError(f"No model header at {path}")
+    except json.JSONDecodeError as e:
+        raise ModelFormatError(f"Corrupt model header: {e}")
+
+    version = header.get('format_version')
+    if version != MODEL_FORMAT_VERSION:
+        raise ModelFormatError(
+            f"Model format {version} is not supported (expected {MODEL_FORMAT_VERSION})"
+        )
+    return header
+
+
+def read_model(model_dir, mmap=True):
+    """
+    Read a model directory
+
+    Returns:
+        (header, arrays, documents) where arrays are read-only memory maps
+    """
+    try:
+        return _read_generation(model_dir, mmap)
+    except FileNotFoundError:
+        pass
+    # The header moved on and its old files were removed while reading: read the new one
+    try:
+        return _read_generation(model_dir, mmap)
+    except FileNotFoundError as e:
+        raise ModelFormatError(f"Model file missing: {e.filename}")
+
+
+def _read_generation(model_dir, mmap):
+    """Every file of the generation the header points at"""
+    header = read_header(model_dir)
+    mmap_mode = 'r' if mmap else None
+
+    arrays = {}
+    for name, info in header['arrays'].items():
+        path = os.path.join(model_dir, info['file'])
+        try:
+            array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        except FileNotFoundError:
+            raise
+        except (OSError, ValueError) as e:
+            raise ModelFormatError(f"Could not read array '{name}': {e}")
+        if list(array.shape) != info['shape'] or str(array.dtype) != info['dtype']:
+            raise ModelFormatError(f"Array '{name}' does not match the header")
+        arrays[name] = array
+
+    documents = {}
+    for name, filename in header['documents'].items():
+        try:
+            with open(os.path.join(model_dir, filename), 'r', encoding='utf-8') as f:
+                documents[name] = json.load(f)
+        except FileNotFoundError:
+            raise
+        except (OSError, json.JSONDecodeError) as e:
+            raise ModelFormatError(f"Could not read document '{name}': {e}")
+
+    return header, arrays, documents
@@ -0,0 +1,124 @@
+"""
+Compact in-memory project records for FYP Buddy AI
+Projects are kept as __slots__ records instead of JSON dicts, with the
+strings that repeat across the catalog (technologies, difficulties,
+departments, durations, topics) interned so every value exists once.
+"""
+import sys
+
+# Fields of trainingdata.json projects, in file order
+PROJECT_FIELDS = (
+    'id', 'name', 'description', 'department', 'technologies', 'hardware',
+    'difficulty', 'duration', 'allowed_at_numl', 'beginner_friendly',
+    'explanation_level', 'related_topics', 'future_scope'
+)
+
+# Fields whose values repeat across projects
+INTERNED_FIELDS = {'department', 'hardware', 'difficulty', 'duration', 'explanation_level'}
+INTERNED_LIST_FIELDS = {'technologies', 'related_topics'}
+
+_UNSET = object()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ProjectRecord:
+    """
+    One project with dict-style read access (record['name'], record.get('duration'))
+
+    Fields missing from the source dict stay unset, so get() falls back to
+    its default exactly as it did on the raw dict. Unknown keys are kept
+    in `extra` so records round-trip through to_dict().
+    """
+    __slots__ = PROJECT_FIELDS + ('extra',)
+
+    def __init__(self, data):
+        extra = None
+        for key, value in data.items():
+            if key in INTERNED_FIELDS:
+                value = _intern(value)
+            elif key in INTERNED_LIST_FIELDS and isinstance(value, list):
+                value = tuple(_intern(item) for item in value)
+            if key in PROJECT_FIELDS:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self.extra = extra
+
+    def __getitem__(self, key):
+        value = self.get(key, _UNSET)
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _UNSET) is not _UNSET
+
+    def get(self, key, default=None):
+        if key in PROJECT_FIELDS:
+            return getattr(self, key, default)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def to_dict(self):
+        """Plain JSON-serialisable dict in the original field order"""
+        data = {}
+        for field in PROJECT_FIELDS:
+            value = getattr(self, field, _UNSET)
+            if value is not _UNSET:
+                data[field] = list(value) if isinstance(value, tuple) else value
+        data.update(self.extra or {})
+        return data
+
+
+def compact_projects(projects):
+    """Convert project dicts from trainingdata.json into ProjectRecords"""
+    return [project if isinstance(project, ProjectRecord) else ProjectRecord(project)
+            for project in projects]
+
+
+def _deep_size(value, seen):
+    """Bytes of a value and everything it holds, counting shared objects once"""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item, seen) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    return size
+
+
+def memory_report(projects):
+    """
+    Approximate memory held by a project list, per field
+
+    Works on ProjectRecords and raw dicts alike, so both layouts can be
+    compared. Objects shared between projects are counted once per field.
+
+    Returns:
+        {'fields': {field: bytes}, 'containers': bytes, 'total': bytes}
+    """
+    fields = {}
+    seen = {field: set() for field in PROJECT_FIELDS}
+    # The record objects themselves (dict tables or slot arrays) plus the list
+    containers = sys.getsizeof(projects)
+    for project in projects:
+        containers += sys.getsizeof(project)
+        for field in PROJECT_FIELDS:
+            value = project.get(field, _UNSET)
+            if value is not _UNSET:
+                fields[field] = fields.get(field, 0) + _deep_size(value, seen[field])
+        if isinstance(project, ProjectRecord) and project.extra:
+            containers += _deep_size(project.extra, set())
+    return {
+        'fields': fields,
+        'containers': containers,
+        'total': containers + sum(fields.values())
+    }
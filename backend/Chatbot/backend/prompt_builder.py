@@ -0,0 +1,169 @@
+"""
+Token-budgeted prompt assembly for FYP Buddy AI
+Sections are filled in priority order - instructions, the new message,
+retrieved knowledge, then recent turns (newest first) - until the budget
+is used up, so long answers in the history cannot grow the prompt.
+"""
+import os
+import re
+from functools import lru_cache
+
+# Estimated tokens for the whole prompt
+DEFAULT_TOKEN_BUDGET = 12000
+# Longest single history turn before it is trimmed
+DEFAULT_MAX_TURN_TOKENS = 400
+# History turns considered (3 exchanges)
+DEFAULT_HISTORY_TURNS = 6
+# Longest rolling summary of older turns kept on a session
+SUMMARY_MAX_TOKENS = 300
+
+TRIM_MARKER = " …[trimmed]"
+
+# Rough BPE approximation: short letter runs, digit groups and single symbols
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+@lru_cache(maxsize=256)
+def estimate_tokens(text):
+    """Local token estimate, close to what the model's tokenizer counts"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def trim_to_tokens(text, max_tokens):
+    """Keep the start of a text so that it fits in max_tokens estimated tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # The marker itself counts against the limit
+    keep = max_tokens - estimate_tokens(TRIM_MARKER)
+    if keep <= 0:
+        return ""
+    for count, match in enumerate(_TOKEN_RE.finditer(text), 1):
+        if count == keep:
+            return text[:match.end()] + TRIM_MARKER
+    return text
+
+
+class PromptBuilder:
+    """Builds one prompt within a token budget and reports the split per section"""
+
+    def __init__(self, budget=None, max_turn_tokens=None, history_turns=None):
+        self.budget = budget or int(os.getenv('PROMPT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET))
+        self.max_turn_tokens = max_turn_tokens or int(
+            os.getenv('PROMPT_MAX_TURN_TOKENS', DEFAULT_MAX_TURN_TOKENS))
+        self.history_turns = history_turns or int(
+            os.getenv('PROMPT_HISTORY_TURNS', DEFAULT_HISTORY_TURNS))
+
+    def build(self, instructions, message, knowledge="", history=(), state_note="", summary="",
+              history_turns=None):
+        """
+        Assemble the prompt
+
+        Args:
+            instructions: System prompt, always included in full
+            message: The student's new message, always included
+            knowledge: Context retrieved for this message (trimmed to fit)
+            history: Formatted turns ("Student: ...", "Assistant: ..."), oldest first
+            state_note: Conversation-state line placed before the history
+            summary: Rolling summary of turns older than the history
+            history_turns: Turns considered instead of self.history_turns (turns not
+                yet folded into the summary must all be offered)
+
+        Returns:
+            (prompt, report) where report holds the estimated tokens per section
+        """
+        conversation_header = "\n\n=== CONVERSATION ===\n" + (f"{state_note}\n" if state_note else "")
+        question = f"Student: {message}\nAssistant:"
+
+        report = {
+            'instructions': estimate_tokens(instructions) + estimate_tokens(conversation_header),
+            'message': estimate_tokens(question)
+        }
+        remaining = self.budget - report['instructions'] - report['message']
+
+        # Retrieved knowledge comes before older conversation
+        if knowledge and remaining > 0:
+            knowledge_tokens = estimate_tokens(knowledge)
+            if knowledge_tokens > remaining:
+                knowledge = trim_to_tokens(knowledge, remaining)
+                knowledge_tokens = estimate_tokens(knowledge)
+        else:
+            knowledge, knowledge_tokens = "", 0
+        report['knowledge'] = knowledge_tokens
+        remaining -= knowledge_tokens
+        
+        # The summary stands in for every turn older than the history
+        summary_text = ""
+        if summary and remaining > 0:
+            summary_text = trim_to_tokens(f"[Summary of the earlier conversation: {summary}]", remaining)
+        report['summary'] = estimate_tokens(summary_text) if summary_text else 0
+        remaining -= report['summary']
+
+        # Newest turns first; long turns are cut to max_turn_tokens
+        turns = []
+        trimmed = 0
+        history_tokens = 0
+        for turn in reversed(list(history)[-(history_turns or self.history_turns):]):
+            if remaining <= 0:
+                break
+            limit = min(self.max_turn_tokens, remaining)
+            tokens = estimate_tokens(turn)
+            if tokens > limit:
+                turn = trim_to_tokens(turn, limit)
+                if not turn:
+                    break
+                tokens = estimate_tokens(turn)
+                trimmed += 1
+            turns.append(turn)
+            history_tokens += tokens
+            remaining -= tokens
+        turns.reverse()
+
+        report['history'] = history_tokens
+        report['turns_included'] = len(turns)
+        report['turns_trimmed'] = trimmed
+        report['total'] = (report['instructions'] + report['message'] + knowledge_tokens
+                           + report['summary'] + history_tokens)
+        report['budget'] = self.budget
+
+        prompt = instructions
+        if knowledge:
+            prompt += "\n\n" + knowledge
+        prompt += conversation_header
+        if summary_text:
+            prompt += f"{summary_text}\n"
+        for turn in turns:
+            prompt += f"{turn}\n"
+        prompt += question
+        return prompt, report
+
+
+def summary_prompt(previous_summary, turns, budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Prompt asking the model to fold older turns into the rolling summary
+
+    Turns are capped like history turns and the newest ones are kept within
+    budget, so a long session summarized for the first time stays bounded.
+    """
+    previous = f"Summary so far:\n{previous_summary}\n\n" if previous_summary else ""
+    header = (
+        "You maintain a running summary of a conversation between a university student "
+        "and FYP Buddy, a Final Year Project assistant.\n"
+        f"{previous}New turns:\n"
+    )
+    footer = (
+        "\n\nWrite the updated summary in under 150 words. Keep the student's interests, skills, "
+        "department, the projects and technologies discussed and any decisions made. "
+        "Reply with the summary only."
+    )
+    remaining = budget - estimate_tokens(header) - estimate_tokens(footer)
+    kept = []
+    for turn in reversed(turns):
+        turn = trim_to_tokens(turn, DEFAULT_MAX_TURN_TOKENS)
+        tokens = estimate_tokens(turn)
+        if tokens > remaining:
+            kept.append("[Earlier turns omitted]")
+            break
+        kept.append(turn)
+        remaining -= tokens
+    kept.reverse()
+    return header + "\n".join(kept) + footer
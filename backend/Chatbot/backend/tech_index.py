@@ -0,0 +1,143 @@
+"""
+Typo-tolerant technology lookup for FYP Buddy AI
+Resolves free-text mentions such as "tensorflw", "node js" or "reactjs"
+to entries of description.json without calling the LLM.
+"""
+import difflib
+import re
+from collections import defaultdict
+
+# Longest technology phrase matched inside a query, in words
+MAX_PHRASE_WORDS = 4
+# Minimum difflib ratio for a fuzzy match
+FUZZY_THRESHOLD = 0.82
+# Shortest token that is matched fuzzily; shorter ones must match exactly
+MIN_FUZZY_LENGTH = 4
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#./-]+")
+_NORMALIZE_RE = re.compile(r"[^a-z0-9+#]")
+
+
+def normalize(text):
+    """Lowercase and drop separators: 'Node.js', 'node js' and 'NodeJS' -> 'nodejs'"""
+    return _NORMALIZE_RE.sub('', text.lower())
+
+
+def trigrams(text):
+    padded = f"^{text}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TechnologyIndex:
+    """Alias map, character trigram index and phrase matcher over technologies"""
+
+    def __init__(self, technologies):
+        """
+        Args:
+            technologies: Mapping of key -> description.json item
+                          (ProjectChatbotTrainer.technologies)
+        """
+        self.aliases = {}
+        self.fuzzy_targets = {}
+        self.trigram_index = defaultdict(set)
+
+        tag_owners = defaultdict(set)
+        for key, item in technologies.items():
+            for tag in item.get('tags', []):
+                tag_owners[normalize(tag)].add(key)
+
+        # Aliases are added in priority order; setdefault keeps the first owner
+        for key, item in technologies.items():
+            name = normalize(item.get('name', key))
+            self.aliases.setdefault(name, key)
+            self.fuzzy_targets.setdefault(name, key)
+
+        for key, item in technologies.items():
+            name = normalize(item.get('name', key))
+            parts = [normalize(part) for part in re.split(r'[/,]', item.get('name', key))]
+            for part in parts:
+                if part and part != name:
+                    self.aliases.setdefault(part, key)
+                    if len(part) >= MIN_FUZZY_LENGTH:
+                        self.fuzzy_targets.setdefault(part, key)
+
+            # Tags that belong to one technology only and spell its name (nodejs, yolo,
+            # huggingface) - but not just the first word of a longer name ("rest")
+            first_word = normalize(item.get('name', key).split()[0])
+            for tag in item.get('tags', []):
+                tag = normalize(tag)
+                if (len(tag) >= MIN_FUZZY_LENGTH and tag_owners[tag] == {key}
+                        and (name.startswith(tag) or tag.startswith(name))
+                        and not (tag == first_word and tag != name)):
+                    self.aliases.setdefault(tag, key)
+
+            # JavaScript libraries are often written with a js suffix: "reactjs"
+            if 'javascript' in item.get('tags', []) and name.isalpha() and not name.endswith(('js', 'script')):
+                self.aliases.setdefault(name + 'js', key)
+
+        for target in self.fuzzy_targets:
+            for gram in trigrams(target):
+                self.trigram_index[gram].add(target)
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def lookup(self, term):
+        """Resolve a single technology name (possibly misspelled) to its key"""
+        normalized = normalize(term)
+        if not normalized:
+            return None
+        if normalized in self.aliases:
+            return self.aliases[normalized]
+        return self._fuzzy(normalized)
+
+    def _fuzzy(self, normalized):
+        if len(normalized) < MIN_FUZZY_LENGTH:
+            return None
+
+        grams = trigrams(normalized)
+        shared = defaultdict(int)
+        for gram in grams:
+            for target in self.trigram_index.get(gram, ()):
+                shared[target] += 1
+
+        best_key, best_ratio = None, FUZZY_THRESHOLD
+        for target, count in shared.items():
+            # Dice coefficient on trigrams filters candidates before difflib
+            if 2 * count / (len(grams) + len(target) + 2) < 0.4:
+                continue
+            # A word that is a shortened name ("three" for threejs) is not a typo
+            if target.startswith(normalized) and len(target) - len(normalized) >= 2:
+                continue
+            ratio = difflib.SequenceMatcher(None, normalized, target).ratio()
+            if ratio >= best_ratio:
+                best_key, best_ratio = self.fuzzy_targets[target], ratio
+        return best_key
+
+    def detect(self, text):
+        """
+        Find every technology mentioned in a free-text query
+
+        Multi-word phrases are matched longest first ("hugging face transformers",
+        "raspberry pi", "node js"); leftover words are matched fuzzily.
+
+        Returns:
+            List of technology keys in order of first mention
+        """
+        tokens = _TOKEN_RE.findall(text.lower())
+        found = []
+        i = 0
+        while i < len(tokens):
+            matched = 0
+            for size in range(min(MAX_PHRASE_WORDS, len(tokens) - i), 0, -1):
+                key = self.aliases.get(normalize(''.join(tokens[i:i + size])))
+                if key:
+                    matched = size
+                    break
+            if not matched:
+                key = self._fuzzy(normalize(tokens[i]))
+                matched = 1
+            if key and key not in found:
+                found.append(key)
+            i += matched
+        return found
@@ -1,195 +1,886 @@
+import hashlib
 import json
-import pickle
+import os
 import re
-from collections import defaultdict
-import math
+import sys
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model_store import (
+    DEFAULT_MODEL_DIR, ModelFormatError, check_source, fingerprint,
+    read_model, update_model, write_model
+)
+from facet_index import RELAX_ORDER, FacetIndex
+from project_store import compact_projects, memory_report
+from tech_index import TechnologyIndex
+
+# Neighbors precomputed per project for "similar projects" lookups
+DEFAULT_NEIGHBORS_K = 10
+# Largest relative IDF move of any term before an incremental neighbor refresh
+# rescores every project instead (keeps kept scores within about 4% of exact)
+DEFAULT_NEIGHBOR_IDF_TOLERANCE = 0.005
+# Dimensions of the LSA embedding (0 disables the semantic stage; 128 is a good size)
+DEFAULT_LSA_DIM = 0
+# Extra random directions and power iterations of the randomized SVD behind LSA
+LSA_OVERSAMPLING = 10
+LSA_POWER_ITERATIONS = 2
+# Share of the LSA score in hybrid lexical + semantic ranking
+DEFAULT_SEMANTIC_WEIGHT = 0.3
+# Entries kept in each search cache (query vectors, result lists)
+DEFAULT_QUERY_CACHE_SIZE = 512
+# Processes used to vectorize the catalog (1 = serial, 0 = one per CPU)
+DEFAULT_BUILD_WORKERS = 1
+# Chunks handed to each worker process, to even out uneven chunks
+CHUNKS_PER_WORKER = 4
+
+# Source file of every model part; a part is rebuilt when its file changes
+DATA_FILES = {
+    'projects': 'data/trainingdata.json',
+    'technologies': 'data/description.json',
+    'intents': 'data/intents.json'
+}
+
+class LRUCache:
+    """Least-recently-used cache with hit/miss counters"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Cached value or None; a hit marks the entry as recently used"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+class SparseMatrix:
+    """Compressed sparse row (CSR) matrix backed by NumPy arrays"""
+    def __init__(self, indptr, indices, data, n_cols, norms=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_cols = n_cols
+        if norms is None:
+            norms = np.sqrt(np.bincount(self.row_ids(), weights=data * data, minlength=len(self)))
+        self.norms = norms
+    
+    def __len__(self):
+        return len(self.indptr) - 1
+    
+    def row_ids(self):
+        """Row number of every stored value (computed once)"""
+        if getattr(self, '_row_ids', None) is None:
+            self._row_ids = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.indptr))
+        return self._row_ids
+    
+    def cosine(self, query_indices, query_values):
+        """Cosine similarity of a sparse query against every row"""
+        query = np.zeros(self.n_cols)
+        query[query_indices] = query_values
+        query_norm = np.sqrt(np.dot(query_values, query_values))
+        if query_norm == 0 or not len(self.data):
+            return np.zeros(len(self))
+        
+        dots = np.bincount(self.row_ids(), weights=self.data * query[self.indices], minlength=len(self))
+        norms = np.where(self.norms > 0, self.norms, 1)
+        return dots / (norms * query_norm)
+    
+    def row(self, i):
+        """Return (indices, data) of a single row"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+class LatentSemanticIndex:
+    """Dense LSA embeddings: TF-IDF vectors reduced with a truncated SVD"""
+    def __init__(self, components, embeddings):
+        # components: vocab x dim projection, embeddings: rows x dim unit vectors
+        self.components = components
+        self.embeddings = embeddings
+    
+    @property
+    def dim(self):
+        return self.components.shape[1]
+    
+    @classmethod
+    def fit(cls, matrix, dim):
+        """
+        Truncated SVD of the row-normalised TF-IDF matrix
+        
+        Randomized SVD (Halko et al.) on the sparse matrix: only rows x (dim + 10)
+        and (dim + 10) x vocabulary dense blocks are built, never rows x vocabulary.
+        """
+        dim = max(0, min(dim, len(matrix), matrix.n_cols))
+        if not dim:
+            return cls(np.zeros((matrix.n_cols, 0), dtype=np.float32),
+                       np.zeros((len(matrix), 0), dtype=np.float32))
+        
+        rows, cols = matrix.row_ids(), matrix.indices
+        data = matrix.data / np.where(matrix.norms > 0, matrix.norms, 1)[rows]
+        
+        def times(dense):
+            # matrix @ dense
+            out = np.zeros((len(matrix), dense.shape[1]))
+            np.add.at(out, rows, data[:, None] * dense[cols])
+            return out
+        
+        def transpose_times(dense):
+            # matrix.T @ dense
+            out = np.zeros((matrix.n_cols, dense.shape[1]))
+            np.add.at(out, cols, data[:, None] * dense[rows])
+            return out
+        
+        # Fixed seed so the same catalog always gives the same embeddings
+        rng = np.random.default_rng(0)
+        width = min(dim + LSA_OVERSAMPLING, len(matrix), matrix.n_cols)
+        basis, _ = np.linalg.qr(times(rng.standard_normal((matrix.n_cols, width))))
+        for _ in range(LSA_POWER_ITERATIONS):
+            projected, _ = np.linalg.qr(transpose_times(basis))
+            basis, _ = np.linalg.qr(times(projected))
+        
+        # SVD of the small width x vocabulary matrix basis.T @ matrix
+        _, _, vt = np.linalg.svd(transpose_times(basis).T, full_matrices=False)
+        components = np.ascontiguousarray(vt[:dim].T, dtype=np.float32)
+        return cls(components, _unit_rows(times(components)).astype(np.float32))
+    
+    def embed(self, indices, values):
+        """Project a sparse TF-IDF vector into the latent space (unit length)"""
+        if not len(indices) or not self.dim:
+            return np.zeros(self.dim, dtype=np.float32)
+        vector = np.asarray(values, dtype=np.float32) @ self.components[indices]
+        return _unit_rows(vector[None, :])[0]
+    
+    def cosine(self, indices, values):
+        """Cosine similarity of a sparse query against every row"""
+        return self.embeddings @ self.embed(indices, values)
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1)
+    return matrix / np.where(norms > 0, norms, 1)[:, None]
+
+def _document_frequencies(documents):
+    """Partial document-frequency table of a chunk of documents"""
+    doc_freq = defaultdict(int)
+    for doc in documents:
+        for term in set(doc.lower().split()):
+            doc_freq[term] += 1
+    return dict(doc_freq)
+
+def _weigh_documents(vectorizer, documents):
+    """TF-IDF rows of a chunk of documents as flat CSR pieces (row lengths, indices, data)"""
+    lengths = []
+    indices = []
+    data = []
+    for doc in documents:
+        row_indices, row_data = vectorizer._weigh(doc.lower().split())
+        lengths.append(len(row_indices))
+        indices.extend(row_indices)
+        data.extend(row_data)
+    return (np.array(lengths, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(data, dtype=np.float64))
 
 class SimpleTFIDF:
     """A simple TF-IDF implementation without scikit-learn"""
     def __init__(self):
         self.vocab = {}
-        self.idf = {}
-        self.documents = []
+        self.idf = np.zeros(0)
         
-    def fit_transform(self, documents):
-        """Simple TF-IDF implementation"""
-        self.documents = documents
+    def fit_transform(self, documents, workers=1):
+        """
+        Simple TF-IDF implementation, returns a SparseMatrix
         
-        # Build vocabulary
-        vocab_set = set()
-        doc_terms = []
-        
-        for doc in documents:
-            terms = doc.lower().split()
-            doc_terms.append(terms)
-            vocab_set.update(terms)
+        With workers > 1 the documents are split into chunks for a process
+        pool: partial document-frequency tables are merged into the
+        vocabulary, then the chunks are weighted in parallel. The result is
+        identical to the serial build.
+        """
+        if workers > 1 and len(documents) > workers:
+            chunk_size = -(-len(documents) // (workers * CHUNKS_PER_WORKER))
+            chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return self._fit_chunks(chunks, pool.map)
+        return self._fit_chunks([documents], map)
+    
+    def _fit_chunks(self, chunks, map_chunks):
+        # Merge the partial document frequencies of every chunk
+        merged_freq = defaultdict(int)
+        for chunk_freq in map_chunks(_document_frequencies, chunks):
+            for term, freq in chunk_freq.items():
+                merged_freq[term] += freq
         
         # Create vocabulary mapping
-        self.vocab = {term: idx for idx, term in enumerate(sorted(vocab_set))}
+        self.vocab = {term: idx for idx, term in enumerate(sorted(merged_freq))}
         
         # Calculate IDF
-        n_docs = len(documents)
-        for term in self.vocab:
-            doc_count = sum(1 for terms in doc_terms if term in terms)
-            self.idf[term] = math.log((n_docs + 1) / (doc_count + 1)) + 1
-        
-        # Calculate TF-IDF vectors
-        vectors = []
-        for terms in doc_terms:
-            vector = [0] * len(self.vocab)
-            term_count = defaultdict(int)
-            
-            # Count term frequencies
-            for term in terms:
-                term_count[term] += 1
-            
-            # Calculate TF-IDF
-            for term, count in term_count.items():
-                if term in self.vocab:
-                    idx = self.vocab[term]
-                    tf = count / len(terms)
-                    vector[idx] = tf * self.idf.get(term, 1)
-            
-            vectors.append(vector)
+        n_docs = sum(len(chunk) for chunk in chunks)
+        doc_freq = np.zeros(len(self.vocab))
+        for term, freq in merged_freq.items():
+            doc_freq[self.vocab[term]] = freq
+        self.idf = np.log((n_docs + 1) / (doc_freq + 1)) + 1
         
-        return vectors
-    
-    def transform(self, query):
-        """Transform a query into TF-IDF vector"""
-        if not self.vocab:
-            return []
+        # Calculate TF-IDF vectors, chunks come back in document order
+        pieces = list(map_chunks(_weigh_documents, [self] * len(chunks), chunks))
+        lengths = np.concatenate([piece[0] for piece in pieces])
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
         
-        terms = query.lower().split()
-        vector = [0] * len(self.vocab)
+        return SparseMatrix(
+            indptr,
+            np.concatenate([piece[1] for piece in pieces]),
+            np.concatenate([piece[2] for piece in pieces]),
+            len(self.vocab)
+        )
+    
+    def _weigh(self, terms):
+        """TF-IDF weights of a tokenised document as sorted (indices, weights)"""
         term_count = defaultdict(int)
         
+        # Count term frequencies
         for term in terms:
             term_count[term] += 1
         
+        weights = {}
         for term, count in term_count.items():
             if term in self.vocab:
                 idx = self.vocab[term]
-                tf = count / len(terms) if terms else 0
-                vector[idx] = tf * self.idf.get(term, 1)
+                tf = count / len(terms)
+                weights[idx] = tf * self.idf[idx]
         
-        return vector
-
-def cosine_similarity(vec1, vec2):
-    """Calculate cosine similarity between two vectors"""
-    if not vec1 or not vec2:
-        return 0
-    
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm1 = math.sqrt(sum(a * a for a in vec1))
-    norm2 = math.sqrt(sum(b * b for b in vec2))
+        row_indices = sorted(weights)
+        return row_indices, [weights[idx] for idx in row_indices]
     
-    if norm1 == 0 or norm2 == 0:
-        return 0
+    def transform(self, query):
+        """Transform a query into sparse (indices, weights) TF-IDF arrays"""
+        if not self.vocab:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        
+        row_indices, row_data = self._weigh(query.lower().split())
+        return np.array(row_indices, dtype=np.int32), np.array(row_data, dtype=np.float64)
     
-    return dot_product / (norm1 * norm2)
+    def terms(self):
+        """Vocabulary terms ordered by column index"""
+        terms = [None] * len(self.vocab)
+        for term, idx in self.vocab.items():
+            terms[idx] = term
+        return terms
+
+def project_text(project):
+    """Combined text representation of a project, used for its TF-IDF vector"""
+    return f"{project['name']} {project['description']} {' '.join(project['technologies'])} {' '.join(project.get('related_topics', []))}".lower()
 
 class ProjectChatbotTrainer:
-    def __init__(self):
+    def __init__(self, log_file=None, neighbors_k=None, lsa_dim=None, workers=None):
+        # Progress output goes to stdout unless a different stream is given
+        self.log_file = log_file
+        self.neighbors_k = neighbors_k if neighbors_k is not None else int(
+            os.getenv('CHATBOT_NEIGHBORS_K', DEFAULT_NEIGHBORS_K))
+        self.neighbor_idf_tolerance = float(
+            os.getenv('CHATBOT_NEIGHBOR_IDF_TOLERANCE', DEFAULT_NEIGHBOR_IDF_TOLERANCE))
+        self.lsa_dim = lsa_dim if lsa_dim is not None else int(os.getenv('CHATBOT_LSA_DIM', DEFAULT_LSA_DIM))
+        self.semantic_weight = float(os.getenv('CHATBOT_SEMANTIC_WEIGHT', DEFAULT_SEMANTIC_WEIGHT))
+        # Normalized query -> sparse TF-IDF vector, and search arguments -> results
+        cache_size = int(os.getenv('CHATBOT_QUERY_CACHE_SIZE', DEFAULT_QUERY_CACHE_SIZE))
+        self.query_cache = LRUCache(cache_size)
+        self.result_cache = LRUCache(cache_size)
+        if workers is None:
+            workers = int(os.getenv('CHATBOT_BUILD_WORKERS', DEFAULT_BUILD_WORKERS))
+        self.build_workers = workers if workers > 0 else (os.cpu_count() or 1)
         self.projects = []
         self.technologies = {}
         self.intents = []
         self.vectorizer = SimpleTFIDF()
-        self.project_vectors = []
-        self.project_texts = []
+        self.project_vectors = None
+        # Top-k similar projects per row and their similarity scores
+        self.neighbors = None
+        self.neighbor_scores = None
+        # IDF per term that the neighbor scores are measured against (set by full rebuilds)
+        self.neighbor_idf = None
+        self.lsa = None
+        self.project_hashes = []
+        # Fingerprints of the data files the current state was built from
+        self.sources = {}
+        # Built lazily from self.technologies / self.projects
+        self.tech_index = None
+        self.facet_index = None
         
-    def load_data(self):
-        """Load data from all JSON files"""
+    def knowledge_version(self):
+        """Short content hash identifying the data this trainer was built from"""
+        digest = hashlib.sha256()
+        for part in sorted(self.sources):
+            digest.update(f"{part}:{self.sources[part].get('sha256')};".encode())
+        return digest.hexdigest()[:12]
+    
+    def _read_source(self, part):
+        """Read a data file and remember the fingerprint of the exact bytes parsed"""
+        path = DATA_FILES[part]
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        self.sources[part] = fingerprint(path, raw)
+        return data
+    
+    def load_projects(self):
+        """Load trainingdata.json"""
+        training_data = self._read_source('projects')
+        self.projects = compact_projects(training_data.get('projects', []))
+        self.facet_index = None
+        print(f"✓ Loaded {len(self.projects)} projects", file=self.log_file)
+    
+    def load_technologies(self):
+        """Load description.json"""
+        desc_data = self._read_source('technologies')
+        self.technologies = {}
+        self.tech_index = None
+        self.facet_index = None
+        tech_count = 0
+        for item in desc_data.get('description', []):
+            self.technologies[item['name'].lower()] = item
+            tech_count += 1
+        print(f"✓ Loaded {tech_count} technologies", file=self.log_file)
+    
+    def load_intents(self):
+        """Load intents.json"""
+        intents_data = self._read_source('intents')
+        self.intents = intents_data.get('intents', [])
+        print(f"✓ Loaded {len(self.intents)} intents", file=self.log_file)
+        
+        # Print intent tags for debugging
+        print(f"  Intent tags: {[intent['tag'] for intent in self.intents]}", file=self.log_file)
+    
+    def load_data(self, parts=None):
+        """Load data from the JSON files (all of them unless parts is given)"""
+        loaders = {
+            'projects': self.load_projects,
+            'technologies': self.load_technologies,
+            'intents': self.load_intents
+        }
         try:
-            # Load trainingdata.json
-            with open('data/trainingdata.json', 'r', encoding='utf-8') as f:
-                training_data = json.load(f)
-                self.projects = training_data.get('projects', [])
-                print(f"✓ Loaded {len(self.projects)} projects")
-            
-            # Load description.json
-            with open('data/description.json', 'r', encoding='utf-8') as f:
-                desc_data = json.load(f)
-                tech_count = 0
-                for item in desc_data.get('description', []):
-                    self.technologies[item['name'].lower()] = item
-                    tech_count += 1
-                print(f"✓ Loaded {tech_count} technologies")
-            
-            # Load intents.json
-            with open('data/intents.json', 'r', encoding='utf-8') as f:
-                intents_data = json.load(f)
-                self.intents = intents_data.get('intents', [])
-                print(f"✓ Loaded {len(self.intents)} intents")
-                
-                # Print intent tags for debugging
-                print(f"  Intent tags: {[intent['tag'] for intent in self.intents]}")
+            for part in parts or DATA_FILES:
+                loaders[part]()
             
             return True
             
         except FileNotFoundError as e:
-            print(f"✗ File not found: {e}")
+            print(f"✗ File not found: {e}", file=self.log_file)
             return False
         except json.JSONDecodeError as e:
-            print(f"✗ Invalid JSON: {e}")
+            print(f"✗ Invalid JSON: {e}", file=self.log_file)
             return False
         except Exception as e:
-            print(f"✗ Error loading data: {e}")
+            print(f"✗ Error loading data: {e}", file=self.log_file)
             return False
     
-    def prepare_project_vectors(self):
-        """Prepare TF-IDF vectors for project similarity search"""
-        for project in self.projects:
-            # Create a combined text representation of the project
-            text = f"{project['name']} {project['description']} {' '.join(project['technologies'])} {' '.join(project.get('related_topics', []))}"
-            self.project_texts.append(text.lower())
-        
-        if self.project_texts:
-            self.project_vectors = self.vectorizer.fit_transform(self.project_texts)
-            print(f"✓ Created TF-IDF vectors for {len(self.project_texts)} projects")
-    
-    def save_trained_model(self, filename='chatbot_model.pkl'):
-        """Save the trained model to a file"""
-        model_data = {
-            'projects': self.projects,
+    def prepare_project_vectors(self, previous_graph=None):
+        """Prepare TF-IDF vectors and the neighbor graph for project similarity search"""
+        # The lowercased texts are only needed while fitting, so they are not kept
+        texts = [project_text(project) for project in self.projects]
+        
+        if texts:
+            self.project_vectors = self.vectorizer.fit_transform(texts, self.build_workers)
+            self.clear_search_cache()
+            workers = f" ({self.build_workers} workers)" if self.build_workers > 1 else ""
+            print(f"✓ Created TF-IDF vectors for {len(texts)} projects{workers}", file=self.log_file)
+            self.build_lsa()
+            self.build_neighbor_graph(previous_graph)
+    
+    def build_lsa(self):
+        """Optional semantic stage: reduce the TF-IDF vectors to dense LSA embeddings"""
+        self.lsa = LatentSemanticIndex.fit(self.project_vectors, self.lsa_dim)
+        self.result_cache.clear()
+        if self.lsa.dim:
+            print(f"✓ LSA embeddings: {self.lsa.dim} dimensions "
+                  f"(vocabulary {self.project_vectors.n_cols})", file=self.log_file)
+    
+    def _expected_lsa_dim(self):
+        return max(0, min(self.lsa_dim, len(self.projects), len(self.vectorizer.vocab)))
+    
+    def _neighbor_graph_state(self):
+        """Snapshot of the current graph, used to refresh it incrementally later"""
+        if self.neighbors is None:
+            return None
+        return {
+            'ids': [p.get('id') for p in self.projects],
+            'hashes': list(self.project_hashes),
+            'neighbors': np.array(self.neighbors),
+            'scores': np.array(self.neighbor_scores),
+            'terms': self.vectorizer.terms(),
+            'reference_idf': None if self.neighbor_idf is None else np.array(self.neighbor_idf)
+        }
+    
+    def _top_neighbors(self, row, k):
+        scores = self.project_vectors.cosine(*self.project_vectors.row(row))
+        scores[row] = -1
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return top, scores[top]
+    
+    def build_neighbor_graph(self, previous=None):
+        """
+        Precompute the top-k most similar projects of every project
+        
+        With the graph of a previous build, only projects whose text changed
+        and rows that pointed at them are rescored in full; every other row
+        merges its old list with the scores against the changed projects.
+        
+        Kept scores were computed under an older IDF. Each term's IDF is
+        compared with the value the stored scores were computed against
+        (self.neighbor_idf); a project with a term that moved by more than
+        neighbor_idf_tolerance t is handled like a changed one. So every score
+        is within a factor ((1 + t) / (1 - t)) ** 4 of the exact one (about 4%
+        for t = 0.005) however many refreshes ran, and a row's list can only
+        differ from a full build among projects that close to its k-th score.
+        """
+        n = len(self.projects)
+        k = max(0, min(self.neighbors_k, n - 1))
+        self.project_hashes = [hashlib.sha1(project_text(p).encode('utf-8')).hexdigest()[:16]
+                               for p in self.projects]
+        neighbors = np.zeros((n, k), dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float32)
+        reference = np.array(self.vectorizer.idf)
+        if k == 0:
+            self.neighbors, self.neighbor_scores, self.neighbor_idf = neighbors, scores, reference
+            return
+        
+        recompute = set(range(n))
+        # Graphs saved without their reference IDF are rebuilt in full
+        if (previous is not None and previous['neighbors'].shape[1] == k
+                and previous.get('reference_idf') is not None):
+            # Terms new to the vocabulary only occur in changed projects
+            old_reference = dict(zip(previous['terms'], previous['reference_idf']))
+            idf = self.vectorizer.idf
+            old_idf = np.array([old_reference.get(term, value)
+                                for term, value in zip(self.vectorizer.terms(), idf)])
+            drifted = np.abs(idf / old_idf - 1) > self.neighbor_idf_tolerance
+            # Rows holding a drifted term are rescored below, so those terms start over
+            reference = np.where(drifted, idf, old_idf)
+            row_drifted = np.bincount(self.project_vectors.row_ids(),
+                                      weights=drifted[self.project_vectors.indices], minlength=n) > 0
+            
+            old_rows = {pid: row for row, pid in enumerate(previous['ids'])}
+            kept = {}
+            for row, p in enumerate(self.projects):
+                old_row = old_rows.get(p.get('id'))
+                if (old_row is not None and previous['hashes'][old_row] == self.project_hashes[row]
+                        and not row_drifted[row]):
+                    kept[old_row] = row
+            
+            kept_rows = set(kept.values())
+            changed = [row for row in range(n) if row not in kept_rows]
+            changed_scores = {row: self.project_vectors.cosine(*self.project_vectors.row(row))
+                              for row in changed}
+            recompute = set(changed)
+            
+            for old_row, row in kept.items():
+                old_neighbors = previous['neighbors'][old_row]
+                if any(int(o) not in kept for o in old_neighbors):
+                    recompute.add(row)
+                    continue
+                candidates = {kept[int(o)]: float(score)
+                              for o, score in zip(old_neighbors, previous['scores'][old_row])}
+                for other in changed:
+                    # Cosine similarity is symmetric
+                    candidates[other] = float(changed_scores[other][row])
+                best = sorted(candidates.items(), key=lambda item: (-item[1], item[0]))[:k]
+                neighbors[row] = [other for other, _ in best]
+                scores[row] = [score for _, score in best]
+        
+        for row in recompute:
+            top, top_scores = self._top_neighbors(row, k)
+            neighbors[row] = top
+            scores[row] = top_scores
+        
+        self.neighbors, self.neighbor_scores, self.neighbor_idf = neighbors, scores, reference
+        print(f"✓ Neighbor graph (k={k}): {len(recompute)}/{n} projects rescored", file=self.log_file)
+    
+    def technology_index(self):
+        """Typo-tolerant lookup index over the loaded technologies"""
+        if self.tech_index is None:
+            self.tech_index = TechnologyIndex(self.technologies)
+        return self.tech_index
+    
+    def find_technology(self, name):
+        """Return the technology entry for a (possibly misspelled) name, or None"""
+        key = self.technology_index().lookup(name)
+        return self.technologies.get(key) if key else None
+    
+    def detect_technologies(self, text):
+        """Keys of all technologies mentioned in a free-text query"""
+        return self.technology_index().detect(text)
+    
+    def project_facets(self):
+        """Bitmap facet index over the loaded projects"""
+        if self.facet_index is None:
+            self.facet_index = FacetIndex(self.projects, self.technology_index())
+        return self.facet_index
+    
+    def query_filters(self, text):
+        """Structured project filters mentioned in a free-text question"""
+        return self.project_facets().parse_query(text, self.detect_technologies(text))
+    
+    def clear_search_cache(self):
+        """Forget cached query vectors and results (the vectorizer changed)"""
+        self.query_cache.clear()
+        self.result_cache.clear()
+    
+    def cache_stats(self):
+        """Hit rates of the query-vector and search-result caches"""
+        return {
+            'query_vectors': self.query_cache.stats(),
+            'results': self.result_cache.stats()
+        }
+    
+    def query_vector(self, query):
+        """Sparse TF-IDF vector of a query, cached by its normalized token string"""
+        normalized = ' '.join(query.lower().split())
+        vector = self.query_cache.get(normalized)
+        if vector is None:
+            vector = self.vectorizer.transform(normalized)
+            self.query_cache.put(normalized, vector)
+        return vector
+    
+    def search(self, query, k=5, filters=None, relax=False, semantic_weight=None):
+        """
+        Rank projects by hybrid TF-IDF + LSA similarity to the query
+        
+        Args:
+            query: Free text
+            k: Number of results
+            filters: Optional FacetIndex.filter() keyword arguments; only
+                     matching projects are ranked
+            relax: Drop filters (least important first) until something matches
+            semantic_weight: Share of the LSA score (0 = keywords only);
+                             defaults to CHATBOT_SEMANTIC_WEIGHT
+        
+        Returns:
+            List of (row, score) pairs, best first
+        """
+        if self.project_vectors is None or not self.projects:
+            return []
+        
+        if semantic_weight is None:
+            semantic_weight = self.semantic_weight
+        
+        # Repeat questions against the same knowledge base are a dictionary hit
+        cache_key = (self.knowledge_version(), ' '.join(query.lower().split()), k,
+                     json.dumps(filters or {}, sort_keys=True, default=str), bool(relax), semantic_weight)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
+        results = self._search(query, k, filters, relax, semantic_weight)
+        self.result_cache.put(cache_key, tuple(results))
+        return results
+    
+    def _search(self, query, k, filters, relax, semantic_weight):
+        query_vector = self.query_vector(query)
+        scores = self.project_vectors.cosine(*query_vector)
+        
+        if self.lsa is not None and self.lsa.dim and semantic_weight > 0:
+            semantic = np.clip(self.lsa.cosine(*query_vector), 0, None)
+            scores = (1 - semantic_weight) * scores + semantic_weight * semantic
+        
+        filters = dict(filters or {})
+        mask = self.project_facets().filter(**filters) if filters else None
+        if relax:
+            for name in RELAX_ORDER:
+                if mask != 0:
+                    break
+                if filters.pop(name, None) is not None:
+                    mask = self.project_facets().filter(**filters)
+        
+        if mask is not None:
+            rows = np.array(FacetIndex.rows(mask), dtype=np.int64)
+            if not len(rows):
+                return []
+            candidate_scores = scores[rows]
+        else:
+            rows = np.arange(len(scores))
+            candidate_scores = scores
+        
+        k = min(k, len(rows))
+        top = np.argpartition(-candidate_scores, k - 1)[:k]
+        # Best score first, ties by catalog order
+        top = top[np.lexsort((rows[top], -candidate_scores[top]))]
+        return [(int(rows[i]), float(candidate_scores[i])) for i in top]
+    
+    def project_summary(self, row, score=None):
+        """Public JSON view of a project (department is kept internal)"""
+        p = self.projects[row]
+        summary = {
+            'id': p.get('id'),
+            'name': p['name'],
+            'description': p['description'],
+            'technologies': p.get('technologies', []),
+            'difficulty': p.get('difficulty'),
+            'duration': p.get('duration'),
+            'hardware': p.get('hardware'),
+            'beginner_friendly': p.get('beginner_friendly'),
+            'related_topics': p.get('related_topics', []),
+            'future_scope': p.get('future_scope')
+        }
+        if score is not None:
+            summary['score'] = round(score, 4)
+        return summary
+    
+    def project_row(self, project_id):
+        """Vector row of a project id, or None"""
+        if getattr(self, '_rows_by_id', None) is None or len(self._rows_by_id) != len(self.projects):
+            self._rows_by_id = {p.get('id'): row for row, p in enumerate(self.projects)}
+        return self._rows_by_id.get(project_id)
+    
+    def recommend(self, query='', filters=None, k=5):
+        """Projects matching the filters (explicit ones win over those parsed from the query)"""
+        combined = self.query_filters(query) if query else {}
+        combined.update(filters or {})
+        results = self.search(query, k=k, filters=combined)
+        return [self.project_summary(row, score) for row, score in results]
+    
+    def similar_projects(self, project_id, k=5):
+        """Projects most similar to the given one by vector similarity, or None if unknown"""
+        row = self.project_row(project_id)
+        if row is None:
+            return None
+        
+        k = min(k, len(self.projects) - 1)
+        if k <= 0:
+            return []
+        
+        # Precomputed graph: O(1) lookup
+        if self.neighbors is not None and k <= self.neighbors.shape[1]:
+            return [self.project_summary(int(other), float(score))
+                    for other, score in zip(self.neighbors[row][:k], self.neighbor_scores[row][:k])]
+        
+        top, top_scores = self._top_neighbors(row, k)
+        return [self.project_summary(int(other), float(score)) for other, score in zip(top, top_scores)]
+    
+    def explain_technology(self, name, k=5):
+        """Technology details plus a few projects that use it, or None if unknown"""
+        key = self.technology_index().lookup(name)
+        if not key:
+            return None
+        
+        tech = self.technologies[key]
+        mask = self.project_facets().filter(technologies=[key]) or 0
+        rows = FacetIndex.rows(mask)
+        return {
+            'name': tech.get('name'),
+            'category': tech.get('category'),
+            'type': tech.get('type'),
+            'short_description': tech.get('short_description'),
+            'long_description': tech.get('long_description'),
+            'difficulty': tech.get('difficulty'),
+            'examples': tech.get('examples', []),
+            'tags': tech.get('tags', []),
+            'more_info_link': tech.get('more_info_link'),
+            'project_count': len(rows),
+            'example_projects': [self.project_summary(row) for row in rows[:k]]
+        }
+    
+    def memory_report(self):
+        """Per-field memory held by the project records"""
+        return memory_report(self.projects)
+    
+    def _document(self, part):
+        """JSON form of a loaded part for the model directory"""
+        if part == 'projects':
+            return [project.to_dict() for project in self.projects]
+        return getattr(self, part)
+    
+    def _model_arrays(self):
+        vectors = self.project_vectors
+        return {
+            'idf': self.vectorizer.idf,
+            'vectors_indptr': vectors.indptr,
+            'vectors_indices': vectors.indices,
+            'vectors_data': vectors.data,
+            'vectors_norms': vectors.norms,
+            'neighbors': self.neighbors,
+            'neighbor_scores': self.neighbor_scores,
+            'neighbor_idf': self.neighbor_idf,
+            'lsa_components': self.lsa.components,
+            'lsa_embeddings': self.lsa.embeddings
+        }
+    
+    def _model_metadata(self):
+        return {
+            'counts': {
+                'projects': len(self.projects),
+                'technologies': len(self.technologies),
+                'intents': len(self.intents),
+                'vocab': len(self.vectorizer.vocab)
+            },
+            'neighbors_k': int(self.neighbors.shape[1]) if self.neighbors is not None else 0,
+            'lsa_dim': self.lsa.dim if self.lsa is not None else 0,
+            'sources': self.sources
+        }
+    
+    def save_trained_model(self, model_dir=DEFAULT_MODEL_DIR):
+        """Save the trained model as a versioned, memory-mappable directory"""
+        documents = {
+            'vocab': self.vectorizer.terms(),
+            'project_hashes': self.project_hashes,
+            'projects': self._document('projects'),
             'technologies': self.technologies,
-            'intents': self.intents,
-            'vectorizer': self.vectorizer,
-            'project_vectors': self.project_vectors,
-            'project_texts': self.project_texts
+            'intents': self.intents
         }
         
-        with open(filename, 'wb') as f:
-            pickle.dump(model_data, f)
-        print(f"✓ Model saved to {filename}")
+        write_model(model_dir, self._model_arrays(), documents, self._model_metadata())
+        print(f"✓ Model saved to {model_dir}/", file=self.log_file)
+    
+    def stale_parts(self, header):
+        """
+        Compare the data files against the hashes recorded in a model header
+        
+        Returns:
+            (stale, touched) lists of part names; touched files only need
+            their recorded timestamps refreshed
+        """
+        recorded = header.get('sources', {})
+        stale, touched = [], []
+        for part, path in DATA_FILES.items():
+            status = check_source(path, recorded.get(part))
+            if status == 'stale':
+                stale.append(part)
+            elif status == 'touched':
+                touched.append(part)
+            elif status == 'missing':
+                print(f"⚠️ {path} not found, serving {part} from the saved model", file=self.log_file)
+        return stale, touched
+    
+    def rebuild_parts(self, header, parts, model_dir=DEFAULT_MODEL_DIR):
+        """Reload the given parts from their data files and rewrite only those"""
+        print(f"⚡ Data changed since the model was built, rebuilding: {', '.join(parts)}", file=self.log_file)
+        previous_graph = self._neighbor_graph_state()
+        if not self.load_data(parts):
+            return False
+        
+        arrays = {}
+        documents = {part: self._document(part) for part in parts}
+        if 'projects' in parts:
+            self.prepare_project_vectors(previous_graph)
+            arrays = self._model_arrays()
+            documents['vocab'] = self.vectorizer.terms()
+            documents['project_hashes'] = self.project_hashes
+        
+        update_model(model_dir, header, arrays, documents, self._model_metadata())
+        print(f"✓ Model updated in {model_dir}/", file=self.log_file)
+        return True
     
-    def load_trained_model(self, filename='chatbot_model.pkl'):
-        """Load a trained model from file"""
+    def load_trained_model(self, model_dir=DEFAULT_MODEL_DIR, rebuild_stale=True):
+        """
+        Load a trained model; numeric arrays are memory-mapped, not copied
+        
+        The data files are checked against the hashes stored with the model.
+        Changed parts are rebuilt when rebuild_stale is set, otherwise the
+        model is refused so that stale data is never served.
+        """
         try:
-            with open(filename, 'rb') as f:
-                model_data = pickle.load(f)
+            header, arrays, documents = read_model(model_dir)
+            
+            if header['counts']['projects'] != len(arrays['vectors_indptr']) - 1:
+                raise ModelFormatError("Project vectors do not match the project count")
+            if header['counts']['projects'] != len(documents['projects']):
+                raise ModelFormatError("Project list does not match the project count")
             
-            self.projects = model_data['projects']
-            self.technologies = model_data['technologies']
-            self.intents = model_data['intents']
-            self.vectorizer = model_data['vectorizer']
-            self.project_vectors = model_data['project_vectors']
-            self.project_texts = model_data['project_texts']
+            terms = documents['vocab']
+            self.vectorizer = SimpleTFIDF()
+            self.vectorizer.vocab = {term: idx for idx, term in enumerate(terms)}
+            self.vectorizer.idf = arrays['idf']
+            self.project_vectors = SparseMatrix(
+                arrays['vectors_indptr'],
+                arrays['vectors_indices'],
+                arrays['vectors_data'],
+                len(terms),
+                norms=arrays['vectors_norms']
+            )
+            self.neighbors = arrays['neighbors']
+            self.neighbor_scores = arrays['neighbor_scores']
+            # Models saved before it was stored get a full graph rebuild on the next refresh
+            self.neighbor_idf = arrays.get('neighbor_idf')
+            self.lsa = LatentSemanticIndex(arrays['lsa_components'], arrays['lsa_embeddings'])
+            self.clear_search_cache()
+            self.project_hashes = documents['project_hashes']
+            self.projects = compact_projects(documents['projects'])
+            self.technologies = documents['technologies']
+            self.tech_index = None
+            self.facet_index = None
+            self.intents = documents['intents']
+            self.sources = dict(header.get('sources', {}))
             
-            print(f"✓ Loaded trained model with:")
-            print(f"  - {len(self.projects)} projects")
-            print(f"  - {len(self.technologies)} technologies")
-            print(f"  - {len(self.intents)} intents")
+            stale, touched = self.stale_parts(header)
+            expected_k = max(0, min(self.neighbors_k, len(self.projects) - 1))
+            if 'projects' not in stale and header.get('neighbors_k') != expected_k:
+                # Neighbor count changed: rebuild just the graph
+                self.build_neighbor_graph()
+                header = update_model(model_dir, header, arrays={
+                    'neighbors': self.neighbors,
+                    'neighbor_scores': self.neighbor_scores,
+                    'neighbor_idf': self.neighbor_idf
+                }, documents={'project_hashes': self.project_hashes},
+                   metadata={'neighbors_k': expected_k})
+            if 'projects' not in stale and header.get('lsa_dim') != self._expected_lsa_dim():
+                # Embedding size changed: refit just the LSA projection
+                self.build_lsa()
+                header = update_model(model_dir, header, arrays={
+                    'lsa_components': self.lsa.components,
+                    'lsa_embeddings': self.lsa.embeddings
+                }, metadata={'lsa_dim': self.lsa.dim})
+            
+            if stale:
+                if not rebuild_stale:
+                    raise ModelFormatError(f"Model is stale for: {', '.join(stale)}")
+                if not self.rebuild_parts(header, stale, model_dir):
+                    raise ModelFormatError("Could not rebuild stale parts from the data files")
+            elif touched:
+                # Same content, new timestamps: record them so the next check stays cheap
+                for part in touched:
+                    with open(DATA_FILES[part], 'rb') as f:
+                        self.sources[part] = fingerprint(DATA_FILES[part], f.read())
+                update_model(model_dir, header, metadata={'sources': self.sources})
+            
+            print(f"✓ Loaded trained model (format v{header['format_version']}) with:", file=self.log_file)
+            print(f"  - {len(self.projects)} projects", file=self.log_file)
+            print(f"  - {len(self.technologies)} technologies", file=self.log_file)
+            print(f"  - {len(self.intents)} intents", file=self.log_file)
             
             # Verify all intents are loaded
-            print(f"  Intent tags loaded: {[intent['tag'] for intent in self.intents]}")
+            print(f"  Intent tags loaded: {[intent['tag'] for intent in self.intents]}", file=self.log_file)
             
             return True
             
-        except FileNotFoundError:
-            print(f"✗ Model file {filename} not found")
+        except ModelFormatError as e:
+            print(f"✗ Model in {model_dir}/ not usable: {e}", file=self.log_file)
             return False
         except Exception as e:
-            print(f"✗ Error loading model: {e}")
+            print(f"✗ Error loading model: {e}", file=self.log_file)
             return False
 
 def main():
@@ -198,7 +889,18 @@ def main():
     print("PROJECT CHATBOT TRAINER")
     print("="*60)
     
-    trainer = ProjectChatbotTrainer()
+    # Build-time knobs: python train_bot.py --neighbors-k 20 --lsa-dim 64 --workers 4
+    neighbors_k = None
+    if '--neighbors-k' in sys.argv:
+        neighbors_k = int(sys.argv[sys.argv.index('--neighbors-k') + 1])
+    lsa_dim = None
+    if '--lsa-dim' in sys.argv:
+        lsa_dim = int(sys.argv[sys.argv.index('--lsa-dim') + 1])
+    workers = None
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+    
+    trainer = ProjectChatbotTrainer(neighbors_k=neighbors_k, lsa_dim=lsa_dim, workers=workers)
     
     # Check if we have a saved model
     if trainer.load_trained_model():
@@ -227,6 +929,11 @@ def main():
         for intent in trainer.intents:
             print(f"  • {intent['tag']} ({len(intent['patterns'])} patterns)")
     
+    report = trainer.memory_report()
+    print(f"\nProject records: {report['total'] / 1024:.0f} KB in memory")
+    for field, size in sorted(report['fields'].items(), key=lambda item: -item[1]):
+        print(f"  • {field}: {size / 1024:.1f} KB")
+    
     if 'python' in trainer.technologies:
         print(f"\nSample technology: Python - {trainer.technologies['python'].get('short_description', 'Not found')[:50]}...")
     
@@ -0,0 +1,158 @@
+"""
+Migrate chat storage to the current MongoDB layout
+- ISO string dates (created_at, updated_at, message timestamps) -> UTC BSON dates
+- Messages embedded in chat_sessions -> pages in chat_messages
+- Indexes: (user_id, updated_at, session_id) compound index, drops the indexes it replaces
+
+Safe to run more than once; documents already migrated are skipped.
+
+Usage:
+    python scripts/migrate_chat_storage.py [--batch-size 500] [--dry-run] [--local-time]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from pymongo import MongoClient, DeleteMany, InsertOne, UpdateOne
+from mongodb_config import get_mongodb_config
+from chat_manager_mongodb import MESSAGE_PAGE_SIZE, ensure_indexes
+
+# Replaced by the (user_id, updated_at, session_id) and (updated_at, session_id) indexes
+REDUNDANT_INDEXES = ('user_id_1', 'user_id_1_updated_at_-1', 'updated_at_-1')
+
+
+def to_utc(value, local_time=False):
+    """UTC datetime from a stored ISO string (other values are returned unchanged)"""
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        # Written by datetime.now() on the server: its local time, or UTC on most hosts
+        parsed = parsed.astimezone() if local_time else parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def convert_messages(messages, local_time):
+    return [dict(message, timestamp=to_utc(message.get('timestamp'), local_time)) for message in messages]
+
+
+def in_batches(collection, query, batch_size):
+    """Yield lists of matching documents, paging on _id so converted ones are not revisited"""
+    last_id = None
+    while True:
+        page_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        batch = list(collection.find(page_query).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]['_id']
+
+
+def migrate_sessions(db, batch_size, dry_run, local_time):
+    """Convert session dates and move embedded messages into pages"""
+    sessions, pages = db['chat_sessions'], db['chat_messages']
+    query = {'$or': [
+        {'created_at': {'$type': 'string'}},
+        {'updated_at': {'$type': 'string'}},
+        {'messages': {'$exists': True}}
+    ]}
+    converted = moved = 0
+    for batch in in_batches(sessions, query, batch_size):
+        session_ops, page_ops = [], []
+        for doc in batch:
+            update = {'$set': {
+                'created_at': to_utc(doc.get('created_at'), local_time),
+                'updated_at': to_utc(doc.get('updated_at'), local_time)
+            }}
+            if 'messages' in doc:
+                messages = convert_messages(doc['messages'], local_time)
+                page_ops.append(DeleteMany({'session_id': doc['session_id']}))
+                page_ops += [
+                    InsertOne({
+                        'session_id': doc['session_id'],
+                        'seq': start // MESSAGE_PAGE_SIZE,
+                        'user_id': doc.get('user_id'),
+                        'messages': messages[start:start + MESSAGE_PAGE_SIZE]
+                    })
+                    for start in range(0, len(messages), MESSAGE_PAGE_SIZE)
+                ]
+                update['$set']['message_count'] = len(messages)
+                update['$unset'] = {'messages': ''}
+                moved += 1
+            session_ops.append(UpdateOne({'_id': doc['_id']}, update))
+        converted += len(batch)
+        if not dry_run:
+            # Pages first, so a session never loses its embedded messages before they are copied
+            if page_ops:
+                pages.bulk_write(page_ops)
+            sessions.bulk_write(session_ops)
+        print(f"   • sessions: {converted} converted, {moved} with embedded messages")
+    return converted
+
+
+def migrate_pages(db, batch_size, dry_run, local_time):
+    """Convert message timestamps inside chat_messages pages"""
+    pages = db['chat_messages']
+    converted = 0
+    for batch in in_batches(pages, {'messages.timestamp': {'$type': 'string'}}, batch_size):
+        ops = [
+            UpdateOne({'_id': doc['_id']}, {'$set': {'messages': convert_messages(doc['messages'], local_time)}})
+            for doc in batch
+        ]
+        converted += len(batch)
+        if not dry_run:
+            pages.bulk_write(ops)
+        print(f"   • message pages: {converted} converted")
+    return converted
+
+
+def migrate_indexes(db, dry_run):
+    """Create the current indexes and drop the ones they replace"""
+    sessions = db['chat_sessions']
+    existing = sessions.index_information()
+    if dry_run:
+        print(f"   • would drop: {[name for name in REDUNDANT_INDEXES if name in existing] or 'nothing'}")
+        return
+    ensure_indexes(db)
+    for name in REDUNDANT_INDEXES:
+        if name in existing:
+            sessions.drop_index(name)
+            print(f"   • dropped index {name}")
+    print("   • indexes up to date")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate FYP Buddy chat storage')
+    parser.add_argument('--batch-size', type=int, default=500, help='Documents per batch (default 500)')
+    parser.add_argument('--dry-run', action='store_true', help='Count what would change without writing')
+    parser.add_argument('--local-time', action='store_true',
+                        help='Read dates without a timezone as this machine\'s local time instead of UTC')
+    args = parser.parse_args()
+
+    config = get_mongodb_config()
+    client = MongoClient(config['uri'], serverSelectionTimeoutMS=5000, tz_aware=True)
+    db = client[config['db_name']]
+
+    print("="*60)
+    print(f"🗄️ Chat storage migration{' (dry run)' if args.dry_run else ''}: {config['db_name']}")
+    print("="*60)
+
+    print("\n📅 Sessions")
+    migrate_sessions(db, args.batch_size, args.dry_run, args.local_time)
+    print("\n💬 Message pages")
+    migrate_pages(db, args.batch_size, args.dry_run, args.local_time)
+    print("\n📇 Indexes")
+    migrate_indexes(db, args.dry_run)
+
+    client.close()
+    print("\n✅ Migration complete")
+
+
+if __name__ == "__main__":
+    main()
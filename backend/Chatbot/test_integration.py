@@ -180,6 +180,310 @@ def test_integration_files():
     
     return all_exist
 
+def _plan_nodes(plan):
+    """Every stage of a MongoDB query plan, outermost first"""
+    nodes = [plan]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            nodes += _plan_nodes(plan[key])
+    for child in plan.get('inputStages', []):
+        nodes += _plan_nodes(child)
+    return nodes
+
+def _mongo_configured():
+    """Load the MongoDB URI from .env into the environment; True when one is set"""
+    if not (os.getenv('MONGO_URI') or os.getenv('MONGODB_URI')) and os.path.exists('.env'):
+        with open('.env', 'r') as f:
+            for line in f:
+                if line.startswith(('MONGO_URI=', 'MONGODB_URI=')):
+                    key, value = line.split('=', 1)
+                    os.environ[key] = value.strip()
+    return bool(os.getenv('MONGO_URI') or os.getenv('MONGODB_URI'))
+
+def test_session_indexes():
+    """Test 7: Check session listing uses the compound index"""
+    print("\n" + "="*60)
+    print("TEST 7: Chat Session Indexes")
+    print("="*60)
+    
+    if not _mongo_configured():
+        print("- MONGO_URI not set, skipped (file-based chat storage)")
+        return True
+    
+    try:
+        sys.path.insert(0, 'backend')
+        from pymongo import MongoClient
+        from mongodb_config import get_mongodb_config
+        from chat_manager_mongodb import SESSION_LIST_FIELDS, SESSION_LIST_INDEX, SESSION_LIST_SORT, ensure_indexes
+        
+        config = get_mongodb_config()
+        client = MongoClient(config['uri'], serverSelectionTimeoutMS=5000)
+        db = client[config['db_name']]
+        ensure_indexes(db)
+        
+        # The list_sessions query for one user
+        explain = (db['chat_sessions']
+                   .find({'user_id': 'index-check'}, SESSION_LIST_FIELDS)
+                   .sort(SESSION_LIST_SORT)
+                   .limit(20)
+                   .explain())
+        nodes = _plan_nodes(explain['queryPlanner']['winningPlan'])
+        client.close()
+        
+        indexes = [node.get('indexName') for node in nodes if node.get('stage') == 'IXSCAN']
+        if SESSION_LIST_INDEX not in indexes:
+            print(f"✗ list_sessions does not use {SESSION_LIST_INDEX} (uses: {indexes or 'collection scan'})")
+            print("  → Run: python scripts/migrate_chat_storage.py")
+            return False
+        print(f"✓ list_sessions uses {SESSION_LIST_INDEX}")
+        
+        if any(node.get('stage') == 'SORT' for node in nodes):
+            print("✗ list_sessions sorts in memory")
+            return False
+        print("✓ No in-memory sort")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
+def test_shutdown_flush():
+    """Test 8: Check buffered chat writes survive SIGTERM"""
+    print("\n" + "="*60)
+    print("TEST 8: Shutdown Flush")
+    print("="*60)
+    
+    if not _mongo_configured():
+        print("- MONGO_URI not set, skipped (file-based chat storage)")
+        return True
+    if sys.platform == 'win32':
+        print("- SIGTERM ends the process immediately on Windows, skipped")
+        return True
+    
+    import signal
+    import subprocess
+    user_id = 'shutdown-check'
+    try:
+        sys.path.insert(0, 'backend')
+        from mongodb_config import get_mongodb_config
+        from chat_manager_mongodb import ChatManagerMongoDB
+        
+        # Buffer every write for an hour, so only the exit flush can store the session
+        env = dict(os.environ, CHAT_WRITE_BEHIND_SECONDS='3600',
+                   GEMINI_API_KEY=os.getenv('GEMINI_API_KEY') or 'shutdown-check')
+        process = subprocess.Popen(
+            [sys.executable, os.path.join('backend', 'chatbot_api.py')],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, env=env
+        )
+        try:
+            if json.loads(process.stdout.readline()).get('status') != 'ready':
+                print("✗ chatbot_api did not start")
+                return False
+            process.stdin.write(json.dumps({'action': 'new_session', 'user_id': user_id,
+                                            'title': 'Shutdown check'}) + "\n")
+            process.stdin.flush()
+            session_id = json.loads(process.stdout.readline())['session_id']
+            
+            # What the Node server does on shutdown (pythonProcess.kill())
+            process.send_signal(signal.SIGTERM)
+            code = process.wait(timeout=30)
+        finally:
+            if process.poll() is None:
+                process.kill()
+        print(f"✓ chatbot_api exited with code {code} on SIGTERM")
+        
+        config = get_mongodb_config()
+        manager = ChatManagerMongoDB(config['uri'], config['db_name'], user_id=user_id)
+        stored = manager.collection.find_one({'session_id': session_id}) is not None
+        if stored:
+            manager.delete_session(session_id)
+        manager.close()
+        
+        if code != 0 or not stored:
+            print("✗ Buffered session was lost on SIGTERM")
+            return False
+        print("✓ Buffered session flushed before exit")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
+def test_neighbor_refresh():
+    """Test 9: Check incremental neighbor refreshes stay within their documented bound"""
+    print("\n" + "="*60)
+    print("TEST 9: Neighbor Graph Refresh")
+    print("="*60)
+    
+    try:
+        import io
+        import numpy as np
+        sys.path.insert(0, 'backend')
+        from train_bot import ProjectChatbotTrainer
+        from project_store import compact_projects
+        
+        trainer = ProjectChatbotTrainer(log_file=io.StringIO())
+        if not trainer.load_data(['projects']):
+            print("✗ Could not load data/trainingdata.json")
+            return False
+        trainer.prepare_project_vectors()
+        
+        # Rewrite a few descriptions, refreshing the graph after each edit
+        edits = {3: "smart irrigation using soil moisture sensors and arduino",
+                 40: "blockchain based voting app",
+                 120: "arduino weather station"}
+        for row, description in edits.items():
+            if row >= len(trainer.projects):
+                continue
+            previous = trainer._neighbor_graph_state()
+            projects = [project.to_dict() for project in trainer.projects]
+            projects[row]['description'] = description
+            trainer.projects = compact_projects(projects)
+            trainer.prepare_project_vectors(previous)
+        
+        k = trainer.neighbors.shape[1]
+        tolerance = trainer.neighbor_idf_tolerance
+        bound = ((1 + tolerance) / (1 - tolerance)) ** 4
+        vectors = trainer.project_vectors
+        for row in range(len(trainer.projects)):
+            exact = vectors.cosine(*vectors.row(row))
+            exact[row] = -1
+            kth = np.sort(exact)[-k]
+            for other, score in zip(trainer.neighbors[row], trainer.neighbor_scores[row]):
+                if not exact[other] / bound - 1e-6 <= score <= exact[other] * bound + 1e-6:
+                    print(f"✗ Project {row}: stored score {score:.4f}, exact {exact[other]:.4f}")
+                    return False
+                if exact[other] * bound < kth - 1e-6:
+                    print(f"✗ Project {row}: neighbor {other} is not near the top {k}")
+                    return False
+        print(f"✓ Refreshed scores within a factor {bound:.3f} of a full build")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
+def test_parallel_build():
+    """Test 10: Check a parallel model build matches the serial one"""
+    print("\n" + "="*60)
+    print("TEST 10: Parallel Model Build")
+    print("="*60)
+    
+    try:
+        import io
+        import numpy as np
+        sys.path.insert(0, 'backend')
+        from train_bot import ProjectChatbotTrainer
+        
+        builds = {}
+        for workers in (1, 4):
+            trainer = ProjectChatbotTrainer(log_file=io.StringIO(), workers=workers)
+            if not trainer.load_data(['projects']):
+                print("✗ Could not load data/trainingdata.json")
+                return False
+            trainer.prepare_project_vectors()
+            builds[workers] = trainer
+        
+        serial, parallel = builds[1], builds[4]
+        if serial.vectorizer.vocab != parallel.vectorizer.vocab:
+            print("✗ Vocabularies differ")
+            return False
+        arrays = {
+            'idf': (serial.vectorizer.idf, parallel.vectorizer.idf),
+            'indptr': (serial.project_vectors.indptr, parallel.project_vectors.indptr),
+            'indices': (serial.project_vectors.indices, parallel.project_vectors.indices),
+            'data': (serial.project_vectors.data, parallel.project_vectors.data)
+        }
+        for name, (expected, actual) in arrays.items():
+            if not np.array_equal(expected, actual):
+                print(f"✗ {name} differs between the serial and the 4-worker build")
+                return False
+        print(f"✓ 4-worker build identical to the serial one ({len(serial.projects)} projects)")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
+def test_message_paging():
+    """Test 11: Check paged message storage reads back the same conversation"""
+    print("\n" + "="*60)
+    print("TEST 11: Message Paging")
+    print("="*60)
+    
+    if not _mongo_configured():
+        print("- MONGO_URI not set, skipped (file-based chat storage)")
+        return True
+    
+    user_id = 'paging-check'
+    try:
+        sys.path.insert(0, 'backend')
+        from mongodb_config import get_mongodb_config
+        from chat_manager_mongodb import HISTORY_BUFFER_SIZE, ChatManagerMongoDB, ChatSession
+        
+        config = get_mongodb_config()
+        
+        def add_messages(manager, session_id, start, end):
+            session = manager.sessions[session_id]
+            for i in range(start, end):
+                session.add_message('user' if i % 2 == 0 else 'assistant', f"paging check message {i}")
+            manager.save_session(session_id)
+            manager.flush()
+        
+        # Saved in two steps, the second one across the first page boundary
+        writer = ChatManagerMongoDB(config['uri'], config['db_name'], user_id=user_id)
+        session_id = writer.create_session("Paging check")
+        add_messages(writer, session_id, 0, 45)
+        add_messages(writer, session_id, 45, 60)
+        writer.close()
+        
+        # Reloaded without its messages, then appended to
+        manager = ChatManagerMongoDB(config['uri'], config['db_name'], user_id=user_id)
+        try:
+            manager.switch_session(session_id)
+            session = manager.sessions[session_id]
+            add_messages(manager, session_id, 60, 70)
+            expected = [f"paging check message {i}" for i in range(70)]
+            formatted = [ChatSession.format_message({'role': 'user' if i % 2 == 0 else 'assistant',
+                                                     'content': content})
+                         for i, content in enumerate(expected)]
+            
+            checks = {
+                'recent_history': session.recent_history() == formatted[-HISTORY_BUFFER_SIZE:],
+                'get_conversation_history(48, 52)': session.get_conversation_history(48, 52) == formatted[48:52]
+            }
+            lazy = not session.is_loaded
+            
+            # Every page, newest first, as the UI scrolls back
+            stored, cursor = [], None
+            while True:
+                page = manager.get_messages(session_id, cursor)
+                stored = page['messages'] + stored
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+            checks['get_messages'] = [message['content'] for message in stored] == expected
+            checks['messages'] = [message['content'] for message in session.messages] == expected
+        finally:
+            manager.delete_session(session_id)
+            manager.close()
+        
+        if not lazy:
+            print("✗ Reloaded session read all its messages for the prompt history")
+            return False
+        print("✓ Reloaded session read only the pages it needed")
+        for name, ok in checks.items():
+            if not ok:
+                print(f"✗ {name} differs from the saved conversation")
+                return False
+            print(f"✓ {name} matches the saved conversation")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("\n" + "="*60)
@@ -192,6 +496,11 @@ def main():
         ("Backend Files", test_backend_files),
         ("Data Files", test_data_files),
         ("Integration Files", test_integration_files),
+        ("Chat Session Indexes", test_session_indexes),
+        ("Shutdown Flush", test_shutdown_flush),
+        ("Neighbor Graph Refresh", test_neighbor_refresh),
+        ("Parallel Model Build", test_parallel_build),
+        ("Message Paging", test_message_paging),
         ("Chatbot Initialization", test_chatbot)
     ]
     